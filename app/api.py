@@ -1,17 +1,28 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+import anyio.to_thread
+import msgspec
+import orjson
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 
 # Import your custom modules
+from app.core.config import settings
 from app.core.loader import data_loader
+from app.core.batching import DynBatcher
 from app.services.graph import app_graph
 
 # --- 1. DATA MODELS (Request/Response) ---
 class PipelineQuery(BaseModel):
     query: str = Field(..., description="The user's bioinformatics request")
 
+# Documents the /generate contract in OpenAPI only; never instantiated per request
 class PipelineResponse(BaseModel):
     status: str
     plan: Optional[Dict[str, Any]] = None
@@ -20,6 +31,20 @@ class PipelineResponse(BaseModel):
     mermaid_code: Optional[str] = None
     error: Optional[str] = None
 
+# Same fields as a msgspec Struct: encoded directly, no validation pass
+class PipelineResponseStruct(msgspec.Struct):
+    status: str
+    plan: Optional[Dict[str, Any]] = None
+    ast_json: Optional[Dict[str, Any]] = None
+    nextflow_code: Optional[str] = None
+    mermaid_code: Optional[str] = None
+    error: Optional[str] = None
+
+encode_response = msgspec.json.Encoder().encode
+
+# Successful /generate responses (encoded bytes), keyed on the normalized query
+generate_cache = TTLCache(maxsize=settings.GENERATE_CACHE_SIZE, ttl=settings.GENERATE_CACHE_TTL)
+
 # --- 2. LIFESPAN (Startup/Shutdown Logic) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -28,40 +53,81 @@ async def lifespan(app: FastAPI):
     Loads the massive FAISS index and JSON catalogs into memory
     so they are ready for the agents immediately.
     """
+    if not settings.PRELOAD:
+        try:
+            data_loader.load_all()
+        except Exception as e:
+            print(f"❌ CRITICAL STARTUP ERROR: {e}")
+    else:
+        data_loader.warmup()
+
+    # Cap the worker threads that run blocking work (sync LangGraph nodes doing
+    # embedding/retrieval, sync endpoints) so they don't oversubscribe the CPU
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=settings.THREAD_POOL_SIZE)
+    )
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREAD_POOL_SIZE
+
+    # Coalesce concurrent /generate query embeddings into batched forwards
+    dyn_batcher = None
+    if data_loader.vector_store:
+        dyn_batcher = DynBatcher(
+            data_loader.vector_store.embeddings.embed_documents,
+            max_batch_size=16,
+            max_delay=0.05
+        )
+        dyn_batcher.start()
+        data_loader.embed_batcher = dyn_batcher
+    app.state.dyn_batcher = dyn_batcher
+
+    # /health is hit constantly by load balancers; serialize its body once
+    app.state.health_body = orjson.dumps({
+        "status": "online",
+        "vector_store": "loaded" if data_loader.vector_store else "not_loaded"
+    })
+
+    yield
+    print("🛑 Server shutting down...")
+    if dyn_batcher:
+        data_loader.embed_batcher = None
+        dyn_batcher.stop()
+
+# With `gunicorn --preload`, load once in the master process before workers fork,
+# so the index and model weights stay copy-on-write shared instead of N copies.
+if settings.PRELOAD:
     try:
         data_loader.load_all()
     except Exception as e:
         print(f"❌ CRITICAL STARTUP ERROR: {e}")
-    yield
-    print("🛑 Server shutting down...")
 
 # --- 3. API APP DEFINITION ---
 app = FastAPI(
     title="Mistral-Nextflow Agent API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    # For production, put specific website URL: ["https://my-website.com"]
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],    
-    allow_headers=["*"],    
-)
+# Only browser clients need CORS; skip the per-request middleware pass otherwise
+if settings.ENABLE_CORS:
+    app.add_middleware(
+        CORSMiddleware,
+        # For production, put specific website URL: ["https://my-website.com"]
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],    
+        allow_headers=["*"],    
+    )
 
 # --- 4. ENDPOINTS ---
 
 @app.get("/health")
-def health_check():
+async def health_check(request: Request):
     """Simple check to see if server is alive."""
-    return {
-        "status": "online", 
-        "vector_store": "loaded" if data_loader.vector_store else "not_loaded"
-    }
+    # Pre-serialized body: no encoder or validation pass per ping
+    return Response(content=request.app.state.health_body, media_type="application/json")
 
-@app.post("/generate", response_model=PipelineResponse)
+@app.post("/generate", responses={200: {"model": PipelineResponse}})
 async def generate_pipeline(request: PipelineQuery):
     """
     Main Endpoint:
@@ -69,6 +135,11 @@ async def generate_pipeline(request: PipelineQuery):
     2. Runs the LangGraph agents (Planner -> Hydrator -> Architect -> Renderer).
     3. Returns the Nextflow code.
     """
+    cache_key = hashlib.blake2b(request.query.strip().lower().encode()).hexdigest()
+    cached = generate_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
     try:
         # Run the graph
         # ainvoke (async) to allow concurrency
@@ -76,19 +147,23 @@ async def generate_pipeline(request: PipelineQuery):
         
         # Check for agent errors
         if result.get("error"):
-            return {
-                "status": "failed",
-                "error": result["error"]
-            }
-
-        return {
-            "status": "success",
-            "plan": result.get("design_plan"),
-            "ast_json": result.get("ast_json"),
-            "nextflow_code": result.get("nextflow_code"),
-            "mermaid_code": result.get("mermaid_code"),
-            "error": None
-        }
+            body = encode_response(PipelineResponseStruct(
+                status="failed",
+                error=result["error"]
+            ))
+            return Response(content=body, media_type="application/json")
+
+        body = encode_response(PipelineResponseStruct(
+            status="success",
+            plan=result.get("design_plan"),
+            ast_json=result.get("ast_json"),
+            nextflow_code=result.get("nextflow_code"),
+            mermaid_code=result.get("mermaid_code"),
+            error=None
+        ))
+        # Only successes are cached; failures should be retried for real
+        generate_cache[cache_key] = body
+        return Response(content=body, media_type="application/json")
 
     except Exception as e:
         # Catch unexpected crashes
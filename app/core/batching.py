@@ -0,0 +1,98 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+class BatcherStopped(RuntimeError):
+    """Raised for queries submitted to (or still queued in) a stopping DynBatcher."""
+
+class DynBatcher:
+    """
+    Coalesces concurrent single-query embedding calls into one batched
+    forward pass. Requests wait at most `max_delay` seconds for company
+    before the batch is flushed to `embed_fn`.
+    """
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]], max_batch_size: int = 16, max_delay: float = 0.05):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="dyn-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            # Under the lock, so no submit() can land behind the sentinel
+            with self._lock:
+                self._stopping = True
+                self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._lock:
+            if self._stopping:
+                raise BatcherStopped("DynBatcher is stopping")
+            self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text: str) -> List[float]:
+        """Blocking entry point for sync callers (e.g. LangGraph worker threads)."""
+        return self.submit(text).result()
+
+    async def process_batched(self, text: str) -> List[float]:
+        """Awaitable entry point for async callers."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None: break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+
+        # Nothing may be left waiting forever on a blocking .result()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(BatcherStopped("DynBatcher stopped"))
+
+    def _flush(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self.embed_fn(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
@@ -7,13 +7,54 @@ class Settings:
     
     # Files
     FAISS_INDEX_PATH = os.path.join(DATA_DIR, "faiss_index")
+    FAISS_DOCSTORE = os.path.join(FAISS_INDEX_PATH, "docstore.msgpack")
     CODE_STORE = os.path.join(DATA_DIR, "code_store_hollow.jsonl")
     CATALOG_COMPONENTS = os.path.join(DATA_DIR, "catalog/catalog_part1_components.json")
     CATALOG_TEMPLATES = os.path.join(DATA_DIR, "catalog/catalog_part2_templates.json")
     CATALOG_RESOURCES = os.path.join(DATA_DIR, "catalog/catalog_part3_resources.json")
+    # Optional prebuilt ASTs (<template_id>.json) served directly for EXACT_MATCH plans
+    TEMPLATE_AST_DIR = os.path.join(DATA_DIR, "template_ast")
+    # Optional LMDB builds of the lookups (python -m app.core.lmdb_store)
+    CODE_STORE_LMDB = os.path.join(DATA_DIR, "code_store_hollow.lmdb")
+    CATALOG_COMPONENTS_LMDB = os.path.join(DATA_DIR, "catalog/catalog_part1.lmdb")
+    CATALOG_TEMPLATES_LMDB = os.path.join(DATA_DIR, "catalog/catalog_part2.lmdb")
+    # INT8 embedder weights; the file name carries the model id + torch/sentence-transformers versions
+    EMBEDDING_INT8_CACHE_DIR = FAISS_INDEX_PATH
+    EMBEDDING_ONNX_DIR = os.path.join(DATA_DIR, "embeddings_onnx")
+    EMBEDDING_GGUF_PATH = os.path.join(DATA_DIR, "embeddings_gguf/qwen3-embedding-0.6b-q8_0.gguf")
     
     # Model Config
     EMBEDDING_MODEL = "Qwen/Qwen3-Embedding-0.6B"
+    # "torch" = sentence-transformers, "onnx" = ONNX Runtime + AVX-512 VNNI INT8,
+    # "gguf" = llama.cpp over a Q8_0 GGUF file (EMBEDDING_GGUF_PATH)
+    EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch").lower()
+    # "int8" = dynamic INT8 quantization of Linear layers (CPU only)
+    # "fp16" = half precision + autocast (CUDA only), "fp32" = unquantized
+    # "auto" = fp16 on CUDA, int8 on CPU
+    EMBEDDING_DTYPE = os.environ.get("EMBEDDING_DTYPE", "auto").lower()
+    EMBEDDING_BATCH_SIZE = int(os.environ.get("EMB_BATCH", 32))
+    # torch.compile the transformer (torch backend, fp16/fp32 only); adds startup time
+    EMBEDDING_COMPILE = bool(os.environ.get("EMBEDDING_COMPILE"))
     LLM_MODEL = "labs-devstral-small-2512"
 
+    # Compiled Nextflow template bytecode, shared across workers/restarts (unset = system temp dir)
+    JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR")
+
+    # Load resources at import time (gunicorn --preload) so forked workers share them
+    PRELOAD = bool(os.environ.get("PRELOAD"))
+
+    # Max threads for blocking work (LangGraph sync nodes, embedding)
+    THREAD_POOL_SIZE = int(os.environ.get("THREAD_POOL_SIZE", 16))
+
+    # Install CORSMiddleware (needed only when browsers call the API directly)
+    ENABLE_CORS = bool(os.environ.get("ENABLE_CORS"))
+
+    # In-process cache of successful /generate responses
+    GENERATE_CACHE_SIZE = int(os.environ.get("GENERATE_CACHE_SIZE", 1024))
+    GENERATE_CACHE_TTL = int(os.environ.get("GENERATE_CACHE_TTL", 3600))
+
+    # In-process cache of planner/architect outputs, keyed on their prompt inputs
+    LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", 256))
+    LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 3600))
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Drop-in replacement for HuggingFaceEmbeddings backed by an INT8
+    ONNX Runtime export of the embedding model.
+    """
+    def __init__(self, model, tokenizer, batch_size: int = 4, max_length: int = 512):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    @classmethod
+    def from_model_id(cls, model_id: str, save_dir: str, **kwargs):
+        """
+        Exports + quantizes `model_id` into `save_dir` on first use,
+        then loads the quantized graph from disk.
+        """
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        quantized_file = "model_quantized.onnx"
+        if not os.path.exists(os.path.join(save_dir, quantized_file)):
+            print(f"Exporting {model_id} to ONNX (first run)...")
+            model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+            tokenizer = AutoTokenizer.from_pretrained(model_id)
+            model.save_pretrained(save_dir)
+            tokenizer.save_pretrained(save_dir)
+
+            quantizer = ORTQuantizer.from_pretrained(model)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=save_dir, quantization_config=qconfig)
+
+        model = ORTModelForFeatureExtraction.from_pretrained(save_dir, file_name=quantized_file)
+        tokenizer = AutoTokenizer.from_pretrained(save_dir)
+        return cls(model, tokenizer, **kwargs)
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+
+        texts = [t.replace("\n", " ") for t in texts]
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            inputs = self.tokenizer(
+                batch, padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np"
+            )
+            hidden = self.model(**inputs).last_hidden_state
+            hidden = np.asarray(hidden)
+            mask = inputs["attention_mask"]
+
+            # Qwen3-Embedding pools on the last real token (not mean pooling),
+            # so we must match that or queries drift from the indexed vectors.
+            if mask[:, -1].all():
+                pooled = hidden[:, -1]
+            else:
+                last = mask.sum(axis=1) - 1
+                pooled = hidden[np.arange(hidden.shape[0]), last]
+
+            pooled = pooled / np.linalg.norm(pooled, axis=1, keepdims=True).clip(min=1e-12)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+
+class LlamaEmbeddings(Embeddings):
+    """
+    Embeddings served by llama.cpp from a GGUF (e.g. Q8_0) export of the model.
+    Convert once offline: convert_hf_to_gguf.py + llama-quantize ... q8_0
+    """
+    def __init__(self, model_path: str, n_ctx: int = 512, batch_size: int = 4):
+        from llama_cpp import Llama
+
+        self.llm = Llama(
+            model_path=model_path,
+            embedding=True,
+            n_ctx=n_ctx,
+            n_threads=os.cpu_count(),
+            verbose=False
+        )
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [t.replace("\n", " ") for t in texts]
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            # normalize=True to match the L2-normalized vectors in the index
+            vectors.extend(self.llm.embed(texts[i:i + self.batch_size], normalize=True))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,91 @@
+import os
+import json
+import threading
+from collections.abc import Mapping
+import lmdb
+
+# Serializes the lazy opens: py-lmdb refuses a second open of the same path in
+# one process. Recreated in fork children in case a parent thread held it.
+_open_lock = threading.Lock()
+
+def _reset_open_lock():
+    global _open_lock
+    _open_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_open_lock)
+
+class LmdbStore(Mapping):
+    """
+    Read-only `id -> JSON value` mapping backed by an mmap'd LMDB file.
+    Only the entries that are actually looked up get paged in and decoded,
+    instead of holding the whole catalog as Python objects.
+
+    The environment is opened lazily in each process: with `--preload` the
+    store is created in the gunicorn master, and an LMDB handle must never
+    be used in a child after fork(), so each worker opens its own.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        # (pid, env) swapped as one tuple so threads never see a mismatched pair
+        self._handle = None
+
+    @property
+    def env(self):
+        pid = os.getpid()
+        handle = self._handle
+        if handle is not None and handle[0] == pid:
+            return handle[1]
+        with _open_lock:
+            handle = self._handle
+            if handle is not None and handle[0] == pid:
+                return handle[1]
+            if handle is not None:
+                # Inherited from the parent: never read through it. With lock=False there
+                # is no reader table, so closing only unmaps our copy (and lets py-lmdb
+                # open the same path again in this process).
+                handle[1].close()
+            env = lmdb.open(self.path, readonly=True, max_readers=64, lock=False)
+            self._handle = (pid, env)
+            return env
+
+    def __getitem__(self, key):
+        with self.env.begin() as txn:
+            raw = txn.get(str(key).encode())
+        if raw is None:
+            raise KeyError(key)
+        return json.loads(raw)
+
+    def __contains__(self, key):
+        if key is None: return False
+        with self.env.begin() as txn:
+            return txn.get(str(key).encode()) is not None
+
+    def __iter__(self):
+        with self.env.begin() as txn:
+            keys = [k.decode() for k in txn.cursor().iternext(keys=True, values=False)]
+        return iter(keys)
+
+    def __len__(self):
+        return self.env.stat()['entries']
+
+def build_lmdb(path: str, items: dict, map_size: int = 1 << 30):
+    """Offline step: dumps `items` into an LMDB file readable by LmdbStore."""
+    env = lmdb.open(path, map_size=map_size)
+    with env.begin(write=True) as txn:
+        # Rebuilds replace the contents: drop keys that left the sources
+        txn.drop(env.open_db(), delete=False)
+        for key, value in items.items():
+            txn.put(str(key).encode(), json.dumps(value).encode())
+    env.close()
+
+if __name__ == "__main__":
+    # python -m app.core.lmdb_store  ->  rebuild the LMDB stores from the JSON sources
+    from app.core.config import settings
+    from app.core.loader import DataLoader
+
+    loader = DataLoader()
+    # Always read the JSON sources, never an existing (possibly stale) LMDB build
+    build_lmdb(settings.CODE_STORE_LMDB, loader._load_code_store(use_lmdb=False))
+    build_lmdb(settings.CATALOG_COMPONENTS_LMDB, loader._load_components(use_lmdb=False))
+    build_lmdb(settings.CATALOG_TEMPLATES_LMDB, loader._load_templates(use_lmdb=False))
+    print("✅ LMDB stores built.")
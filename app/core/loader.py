@@ -1,61 +1,334 @@
 import os
-import json
+import re
+import mmap
+import orjson
+import simdjson
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+import torch
+import faiss
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from app.core.config import settings
+from app.core.embeddings import OnnxEmbeddings, LlamaEmbeddings
+from app.core.vector_store import MmapVectorStore
+from app.core.lmdb_store import LmdbStore
+
+_get_id = itemgetter('id')
 
 class DataLoader:
     def __init__(self):
         self.vector_store = None
+        self.embed_batcher = None
         self.code_db = {}
         self.comp_db = {}
         self.tmpl_db = {}
         self.res_list = []
+        self.res_by_name = {}
+        self.helper_names = frozenset()
+        self.helper_automaton = None
+        self.template_asts = {}
 
     def load_all(self):
         print("Loading Resources...")
         self._load_lookups()
         self._load_vector_store()
+        # A preloaded master must not spin up torch/OpenMP threads before fork;
+        # each worker warms up from `lifespan` instead.
+        if not settings.PRELOAD:
+            self.warmup()
         print("✅ Resources Loaded.")
 
+    def warmup(self):
+        """
+        Runs one dummy query end-to-end so the first real request does not pay
+        for kernel selection, lazy graph init, and cold index pages.
+        """
+        if not self.vector_store: return
+        try:
+            vector = self.vector_store.embeddings.embed_query("warmup")
+            self.vector_store.similarity_search_by_vector(vector, k=1)
+        except Exception as e:
+            print(f"⚠️ Warmup Error: {e}")
+
     def _load_lookups(self):
-        # Load Code Store
-        if os.path.exists(settings.CODE_STORE):
-            with open(settings.CODE_STORE, 'r') as f:
-                for line in f:
-                    try:
-                        entry = json.loads(line)
-                        if entry.get('id'): self.code_db[entry['id']] = entry['content']
-                    except: continue
-
-        # Load Catalogs
-        if os.path.exists(settings.CATALOG_COMPONENTS):
-            with open(settings.CATALOG_COMPONENTS, 'r') as f:
-                self.comp_db = {c['id']: c for c in json.load(f).get('components', [])}
-                
-        if os.path.exists(settings.CATALOG_TEMPLATES):
-            with open(settings.CATALOG_TEMPLATES, 'r') as f:
-                self.tmpl_db = {c['id']: c for c in json.load(f).get('templates', [])}
-               
-        if os.path.exists(settings.CATALOG_RESOURCES):
-            with open(settings.CATALOG_RESOURCES, 'r') as f:
-                self.res_list = json.load(f).get('resources', {}).get('helper_functions', [])
+        # Disk reads + JSON decode of the four stores overlap in a thread pool
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            code_db = pool.submit(self._load_code_store)
+            comp_db = pool.submit(self._load_components)
+            tmpl_db = pool.submit(self._load_templates)
+            res_list = pool.submit(self._load_resources)
+            template_asts = pool.submit(self._load_template_asts)
+
+            self.code_db = code_db.result()
+            self.comp_db = comp_db.result()
+            self.tmpl_db = tmpl_db.result()
+            self.res_list = res_list.result()
+            # Helper lookups used by the hydrator on every request
+            self.res_by_name = {r['name']: r for r in self.res_list}
+            self.helper_names = frozenset(self.res_by_name)
+            self.helper_automaton = self._build_helper_automaton(self.helper_names)
+            self.template_asts = template_asts.result()
+
+    def _load_code_store(self, use_lmdb=True):
+        if use_lmdb and os.path.exists(settings.CODE_STORE_LMDB):
+            return LmdbStore(settings.CODE_STORE_LMDB)
+
+        code_db = {}
+        if not os.path.exists(settings.CODE_STORE) or not os.path.getsize(settings.CODE_STORE):
+            return code_db
+
+        # NDJSON, parsed with simdjson over an mmap'd buffer
+        parser = simdjson.Parser()
+        bad = 0
+        with open(settings.CODE_STORE, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for line in iter(buf.readline, b''):
+                line = line.strip()
+                if not line: continue
+                # Cheap structural check before paying for a parse + exception
+                if line[0] != 0x7B:  # b'{'
+                    bad += 1
+                    continue
+                try:
+                    entry = parser.parse(line)
+                except (ValueError, RuntimeError):
+                    bad += 1
+                    continue
+                if isinstance(entry, simdjson.Object):
+                    entry_id, content = entry.get('id'), entry.get('content')
+                    # Only plain strings: an Object/Array proxy would pin the parser
+                    if entry_id and isinstance(entry_id, str) and isinstance(content, str):
+                        code_db[entry_id] = content
+                    else:
+                        bad += 1
+                    del entry_id, content
+                # The parser can only be reused once no proxy object references it
+                del entry
+        if bad:
+            print(f"⚠️ Code Store: skipped {bad} malformed line(s)")
+        return code_db
+
+    def _load_components(self, use_lmdb=True):
+        if use_lmdb and os.path.exists(settings.CATALOG_COMPONENTS_LMDB):
+            return LmdbStore(settings.CATALOG_COMPONENTS_LMDB)
+        if not os.path.exists(settings.CATALOG_COMPONENTS): return {}
+        items = self._read_json(settings.CATALOG_COMPONENTS).get('components', [])
+        return dict(zip(map(_get_id, items), items))
+
+    def _load_templates(self, use_lmdb=True):
+        if use_lmdb and os.path.exists(settings.CATALOG_TEMPLATES_LMDB):
+            return LmdbStore(settings.CATALOG_TEMPLATES_LMDB)
+        if not os.path.exists(settings.CATALOG_TEMPLATES): return {}
+        items = self._read_json(settings.CATALOG_TEMPLATES).get('templates', [])
+        return dict(zip(map(_get_id, items), items))
+
+    def _load_resources(self):
+        if not os.path.exists(settings.CATALOG_RESOURCES): return []
+        return self._read_json(settings.CATALOG_RESOURCES).get('resources', {}).get('helper_functions', [])
+
+    def _load_template_asts(self):
+        if not os.path.isdir(settings.TEMPLATE_AST_DIR): return {}
+        template_asts = {}
+        for entry in os.scandir(settings.TEMPLATE_AST_DIR):
+            name, ext = os.path.splitext(entry.name)
+            if ext == '.json' and entry.is_file():
+                template_asts[name] = self._read_json(entry.path)
+        return template_asts
+
+    @staticmethod
+    def _build_helper_automaton(names):
+        # Optional pyahocorasick: one pass over a source file finds every helper name
+        try:
+            import ahocorasick
+        except ImportError:
+            return None
+        if not names: return None
+        automaton = ahocorasick.Automaton()
+        for name in names:
+            automaton.add_word(name, name)
+        automaton.make_automaton()
+        return automaton
+
+    @staticmethod
+    def _read_json(path):
+        # orjson straight off the mapped bytes: no read() copy, no UTF-8 decode to str
+        if not os.path.getsize(path): return {}
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            with memoryview(buf) as view:
+                return orjson.loads(view)
 
     def _load_vector_store(self):
-        print(f"Loading Embeddings {settings.EMBEDDING_MODEL} (CPU)...")
+        embeddings = self._load_embeddings()
+        try:
+            if os.path.exists(settings.FAISS_DOCSTORE):
+                self.vector_store = MmapVectorStore.load(
+                    settings.FAISS_INDEX_PATH,
+                    settings.FAISS_DOCSTORE,
+                    embeddings
+                )
+            else:
+                # Fallback: pickle-based LangChain store, then export the msgpack docstore for next time
+                self.vector_store = FAISS.load_local(
+                    settings.FAISS_INDEX_PATH, 
+                    embeddings, 
+                    allow_dangerous_deserialization=True
+                )
+                try:
+                    MmapVectorStore.export_docstore(self.vector_store, settings.FAISS_DOCSTORE)
+                except OSError as e:
+                    print(f"⚠️ Docstore Export Error: {e}")
+
+            self._drop_precomputed_tables(self.vector_store.index)
+        except Exception as e:
+            print(f"⚠️ Vector Store Error: {e}")
+
+    def _drop_precomputed_tables(self, index):
+        """
+        IVFPQ indexes keep a precomputed distance table that can be many times
+        the on-disk index size (per worker). Trade a little query speed for RAM.
+        Flat indexes have no such table and are left untouched.
+        """
+        inner = faiss.downcast_index(index)
+        if isinstance(inner, faiss.IndexIVFPQ) and inner.use_precomputed_table:
+            inner.use_precomputed_table = False
+            inner.precomputed_table.resize(0)
+
+    def _load_embeddings(self):
+        if settings.EMBEDDING_BACKEND == "onnx":
+            print(f"Loading Embeddings {settings.EMBEDDING_MODEL} (ONNX Runtime, INT8)...")
+            return OnnxEmbeddings.from_model_id(
+                settings.EMBEDDING_MODEL,
+                settings.EMBEDDING_ONNX_DIR,
+                batch_size=settings.EMBEDDING_BATCH_SIZE
+            )
+
+        if settings.EMBEDDING_BACKEND == "gguf":
+            print(f"Loading Embeddings {settings.EMBEDDING_GGUF_PATH} (llama.cpp)...")
+            return LlamaEmbeddings(
+                settings.EMBEDDING_GGUF_PATH,
+                batch_size=settings.EMBEDDING_BATCH_SIZE
+            )
+
+        # A CUDA context does not survive fork(), so preloaded masters stay on CPU
+        device = 'cuda' if not settings.PRELOAD and torch.cuda.is_available() else 'cpu'
+        dtype = settings.EMBEDDING_DTYPE
+        if dtype == "auto":
+            dtype = "fp16" if device == 'cuda' else "int8"
+
+        print(f"Loading Embeddings {settings.EMBEDDING_MODEL} ({device.upper()}, {dtype})...")
         embeddings = HuggingFaceEmbeddings(
             model_name=settings.EMBEDDING_MODEL,
-            model_kwargs={'device': 'cpu', 'trust_remote_code': True},
-            encode_kwargs={'normalize_embeddings': True, 'batch_size': 4}
+            model_kwargs={'device': device, 'trust_remote_code': True},
+            encode_kwargs={'normalize_embeddings': True, 'batch_size': settings.EMBEDDING_BATCH_SIZE}
         )
+        if dtype == "int8" and device == 'cpu':
+            self._quantize_embeddings(embeddings)
+        elif dtype == "fp16" and device == 'cuda':
+            self._enable_fp16(embeddings)
+        if settings.EMBEDDING_COMPILE and dtype != "int8":
+            self._compile_embeddings(embeddings, device)
+        return embeddings
+
+    def _compile_embeddings(self, embeddings, device):
+        """
+        Wraps the transformer inside the SentenceTransformer with torch.compile
+        so LayerNorm/softmax/activation chains run as fused kernels. Only the
+        inner module is compiled; encode(), pooling and normalize stay eager.
+        """
+        if tuple(int(p) for p in torch.__version__.split(".")[:2]) < (2, 1):
+            print(f"⚠️ torch.compile needs torch>=2.1 (found {torch.__version__})")
+            return
         try:
-            self.vector_store = FAISS.load_local(
-                settings.FAISS_INDEX_PATH, 
-                embeddings, 
-                allow_dangerous_deserialization=True
+            transformer = embeddings._client[0]
+            # CUDA graphs ("reduce-overhead") only exist on GPU
+            mode = "reduce-overhead" if device == 'cuda' else "default"
+            transformer.auto_model = torch.compile(
+                transformer.auto_model, mode=mode, fullgraph=False, dynamic=True
             )
         except Exception as e:
-            print(f"⚠️ Vector Store Error: {e}")
+            print(f"⚠️ torch.compile Error: {e}")
+
+    def _enable_fp16(self, embeddings):
+        """
+        Casts the model to FP16 and runs every encode() under CUDA autocast,
+        so any op left in FP32 (e.g. pooling/normalize) is still dispatched
+        to half-precision kernels where safe.
+        """
+        model = embeddings._client.half()
+        encode = model.encode
+
+        def encode_fp16(*args, **kwargs):
+            with torch.amp.autocast(device_type='cuda', dtype=torch.float16):
+                return encode(*args, **kwargs)
+
+        model.encode = encode_fp16
+        embeddings._client = model
+
+    def _quantize_embeddings(self, embeddings):
+        """
+        Swaps the SentenceTransformer behind `embeddings` for a dynamically
+        quantized INT8 copy (nn.Linear weights only, activations stay FP32).
+        The INT8 state_dict is cached next to the FAISS index; later startups
+        load it (weights_only=True, no pickled code runs) into empty dynamic
+        Linear layers instead of quantizing the float weights again.
+        """
+        try:
+            cache_path = self._int8_cache_path()
+            model = None
+            if os.path.exists(cache_path):
+                print(f"Loading INT8 Embeddings from {cache_path}...")
+                try:
+                    state = torch.load(cache_path, map_location='cpu', weights_only=True)
+                    model = self._load_int8_state(embeddings._client, state)
+                except Exception as e:
+                    print(f"⚠️ INT8 Cache Load Error: {e}")
+
+            if model is None:
+                print("Quantizing Embeddings to INT8 (first run)...")
+                model = torch.quantization.quantize_dynamic(
+                    embeddings._client, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                try:
+                    torch.save(model.state_dict(), cache_path)
+                except OSError as e:
+                    # Read-only data dir: keep the quantized model, just skip the cache
+                    print(f"⚠️ INT8 Cache Write Error: {e}")
+            embeddings._client = model
+        except Exception as e:
+            # Fall back to the FP32 model rather than failing startup
+            print(f"⚠️ INT8 Quantization Error: {e}")
+
+    @staticmethod
+    def _load_int8_state(model, state):
+        """
+        Replaces every nn.Linear (the modules quantize_dynamic would convert)
+        with an empty dynamic INT8 Linear, then fills them from `state`.
+        Restores the float layers if the state does not fit the model.
+        """
+        from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear
+        swapped = []
+        for parent in list(model.modules()):
+            for name, child in list(parent.named_children()):
+                if type(child) is torch.nn.Linear:
+                    setattr(parent, name, DynamicLinear(
+                        child.in_features, child.out_features,
+                        bias_=child.bias is not None, dtype=torch.qint8
+                    ))
+                    swapped.append((parent, name, child))
+        try:
+            model.load_state_dict(state)
+        except Exception:
+            for parent, name, child in swapped:
+                setattr(parent, name, child)
+            raise
+        return model
+
+    @staticmethod
+    def _int8_cache_path():
+        # A different model or library version must never pick up another build's weights
+        import sentence_transformers
+        key = f"{settings.EMBEDDING_MODEL}-torch{torch.__version__}-st{sentence_transformers.__version__}"
+        return os.path.join(settings.EMBEDDING_INT8_CACHE_DIR, re.sub(r'[^\w.-]', '_', key) + "-int8.pt")
 
 # Global Instance
 data_loader = DataLoader()
\ No newline at end of file
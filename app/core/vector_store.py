@@ -0,0 +1,52 @@
+import os
+from typing import List
+import numpy as np
+import faiss
+import msgpack
+from langchain_core.documents import Document
+
+class MmapVectorStore:
+    """
+    Read-only stand-in for LangChain's FAISS store.
+    The raw index is memory-mapped and the docstore is a compact msgpack list
+    of [doc_id, page_content, metadata] records, one per FAISS row.
+    """
+    def __init__(self, index, records, embeddings):
+        self.index = index
+        self.records = records
+        self.embeddings = embeddings
+
+    @classmethod
+    def load(cls, index_path: str, docstore_path: str, embeddings):
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        # Newer faiss builds can also mmap flat (IndexFlatCodes) storage
+        flags |= getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+        index = faiss.read_index(os.path.join(index_path, 'index.faiss'), flags)
+
+        with open(docstore_path, 'rb') as f:
+            records = msgpack.unpackb(f.read(), raw=False)
+        return cls(index, records, embeddings)
+
+    @staticmethod
+    def export_docstore(store, docstore_path: str):
+        """Dumps the docstore of a LangChain FAISS store into the msgpack format above."""
+        records = []
+        for i in range(len(store.index_to_docstore_id)):
+            doc = store.docstore.search(store.index_to_docstore_id[i])
+            records.append([doc.id, doc.page_content, doc.metadata])
+        with open(docstore_path, 'wb') as f:
+            f.write(msgpack.packb(records, use_bin_type=True))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        vector = np.array([embedding], dtype=np.float32)
+        _, indices = self.index.search(vector, k)
+
+        docs = []
+        for i in indices[0]:
+            if i == -1: continue
+            doc_id, page_content, metadata = self.records[i]
+            docs.append(Document(id=doc_id, page_content=page_content, metadata=metadata))
+        return docs
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k)
@@ -1,31 +1,87 @@
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
 import re
-from typing import Any, Dict, Literal, List, Optional, Union
+import sys
+from dataclasses import dataclass
+from typing import Annotated, Any, Dict, Literal, List, Optional, Union, get_args
+
+# --- PRECOMPILED PATTERNS (validators run per node, keep them off re's cache) ---
+_PROC_CALL_RE = re.compile(r'^([a-zA-Z0-9_]+)\s*\((.*)\)(\.[a-zA-Z0-9_]+)?$')
+_DOTTED_IDENT_RE = re.compile(r'^[a-zA-Z_][\w]*(\.[a-zA-Z_][\w]*)*$')
+_FUNC_CALL_RE = re.compile(r'^[a-zA-Z_][\w]*\(.*\)$')
+_ROOT_VAR_RE = re.compile(r'^([a-zA-Z_][a-zA-Z0-9_]*)')
+_TOOL_PREFIX_RE = re.compile(r'step_|prepare_|module_|get')
+# DSL2 constructs that must never appear inside a Process script
+_FORBIDDEN_DSL_RE = re.compile(r'workflow|\.cross\(|\.join\(|\.multiMap|\.map\{|\.mix\(')
+# Channel operators that must be a ChannelChain, not hidden in an Assignment value
+_HIDDEN_CHAIN_RE = re.compile(r'\.(?:map|cross)')
+
+_VALID_FACTORIES = frozenset({
+    "Channel.fromPath", "Channel.fromFilePairs", "Channel.of", 
+    "Channel.value", "Channel.fromSRA", "Channel.empty", "Channel.fromList",
+    "Channel.topic"
+})
+_VALID_FACTORIES_STR = ", ".join(sorted(_VALID_FACTORIES))
+
+def _is_simple_ident(s: str) -> bool:
+    """[a-zA-Z_][a-zA-Z0-9_]* without the regex engine."""
+    return s.isascii() and s.isidentifier()
+
+def _is_dotted_path(s: str) -> bool:
+    r"""[a-zA-Z_][\w.]* (e.g. 'FASTQC.out.zip') without the regex engine."""
+    return s[0] != '.' and s[0].isascii() and s.replace('.', '_').isidentifier()
 
 def repair_lazy_calls(statements: List[Any]) -> List[Any]:
     """
-    Recursively scans for assignments that look like process calls 
-    and converts them to ProcessCall nodes. Handles nested conditionals.
+    Scans for assignments that look like process calls 
+    and converts them to ProcessCall nodes. Handles nested conditionals
+    with a worklist (no recursion); bodies shared between branches are
+    only repaired once per call.
     """
     if not isinstance(statements, list): return statements
 
-    cleaned = []
+    root = []
+    # id(original body) -> (original body, its repaired list); holding the original
+    # keeps it alive so its id cannot be reused by a fresh list during the walk
+    seen = {id(statements): (statements, root)}
+    work = [(statements, root)]
+
+    while work:
+        stmts, cleaned = work.pop()
+        _repair_body(stmts, cleaned, seen, work)
+
+    return root
+
+def _repair_body(statements, cleaned, seen, work):
+    """One flat pass of repair_lazy_calls; nested bodies are queued on `work`."""
     for stmt in statements:
         if isinstance(stmt, dict):
             if stmt.get('type') == 'conditional':
-                stmt['body'] = repair_lazy_calls(stmt.get('body', []))
+                body = stmt.get('body', [])
+                if isinstance(body, list):
+                    key = id(body)
+                    if key not in seen:
+                        seen[key] = (body, [])
+                        work.append(seen[key])
+                    body = seen[key][1]
+                stmt['body'] = body
                 cleaned.append(stmt)
                 continue
 
             if stmt.get('type') == 'assignment':
-                val = stmt.get('value', '').strip()
+                val = stmt.get('value', '')
+                # Most assignments are not calls at all; skip them on one 'in' test
+                if '(' not in val:
+                    cleaned.append(stmt)
+                    continue
+                val = val.strip()
                 var = stmt.get('variable')
                 
-                match = re.match(r'^([a-zA-Z0-9_]+)\s*\((.*)\)(\.[a-zA-Z0-9_]+)?$', val)
+                # Check known tool prefixes first (one scan), then the full call shape
+                match = _TOOL_PREFIX_RE.search(val) and _PROC_CALL_RE.match(val)
                 
-                # Check known tool prefixes
-                if match and any(x in val for x in ["step_", "prepare_", "module_", "get"]):
-                    proc_name = match.group(1)
+                if match:
+                    # Interned: these names are compared and hashed repeatedly in scope checks
+                    proc_name = sys.intern(match.group(1))
                     raw_args = match.group(2)
                     suffix = match.group(3)
                     
@@ -36,14 +92,12 @@ def repair_lazy_calls(statements: List[Any]) -> List[Any]:
                         "process_name": proc_name,
                         "args": args_list, # Pydantic will parse these strings into Objects later
                         "assign_to": var,
-                        "output_attribute": suffix[1:] if suffix else None
+                        "output_attribute": sys.intern(suffix[1:]) if suffix else None
                     }
                     cleaned.append(new_stmt)
                     continue # Skip appending the original stmt
         
         cleaned.append(stmt)
-    
-    return cleaned
 
 class ImportItem(BaseModel):
     module_path: str = Field(..., description="Path to the module. MUST start with '../steps/' or '../functions/'.")
@@ -51,14 +105,13 @@ class ImportItem(BaseModel):
 
     @field_validator('functions')
     def validate_aliases(cls, v):
-        cleaned = []
+        # Validation only; the list is returned as-is rather than copied
         for func in v:
             if ' as ' in func:
-                parts = func.split(' as ')
-                if len(parts) != 2 or not parts[0].strip() or not parts[1].strip():
+                original, _, alias = func.partition(' as ')
+                if ' as ' in alias or not original.strip() or not alias.strip():
                     raise ValueError(f"Invalid alias format: '{func}'. Use 'OriginalName as AliasName'")
-            cleaned.append(func)
-        return cleaned
+        return v
         
 class GlobalString(BaseModel):
     type: Literal['string'] = 'string'
@@ -92,7 +145,7 @@ class LogicOperator(BaseModel):
                     "Example: ['trimmed: it', 'ref: it.id']"
     )
     
-    args: List[str] = Field(default=[], max_length=0, description="Must be empty for this operator.")
+    args: List[str] = Field(default_factory=list, max_length=0, description="Must be empty for this operator.")
 
 # --- Category 2: Parametric Operators (MUST have (...) args, NO closure) ---
 class ParametricOperator(BaseModel):
@@ -106,26 +159,29 @@ class ParametricOperator(BaseModel):
                     "For join/mix use channel names."
     )
     
-    closure_lines: List[str] = Field(default=[], max_length=0, description="Must be empty for this operator.")
+    closure_lines: List[str] = Field(default_factory=list, max_length=0, description="Must be empty for this operator.")
 
 # --- Category 3: Flexible Operators (Can have Args OR Closure) ---
+# Flexible operators that are meaningless without args or a closure
+_CONTENT_REQUIRED_OPS = frozenset({'filter'})
+
 class FlexibleOperator(BaseModel):
     operator: Literal['filter', 'unique', 'distinct', 'collect', 'buffer']
     
     args: List[str] = Field(
-        default=[], 
+        default_factory=list, 
         description="Optional arguments (e.g. 'flat: false' for collect)."
     )
     
     closure_lines: List[str] = Field(
-        default=[], 
+        default_factory=list, 
         description="Optional closure block. Use this for mapping logic or filter conditions."
     )
 
     @model_validator(mode='after')
     def validate_has_content(self):
         if not self.args and not self.closure_lines:
-             if self.operator in ['filter']:
+             if self.operator in _CONTENT_REQUIRED_OPS:
                 raise ValueError(f"Operator '{self.operator}' requires either arguments or a closure block.")
         return self
 
@@ -133,8 +189,8 @@ class FlexibleOperator(BaseModel):
 class StructuralOperator(BaseModel):
     operator: Literal['flatten', 'transpose']
     
-    args: List[str] = Field(default=[], description="Usually empty for these operators.")
-    closure_lines: List[str] = Field(default=[], max_length=0)
+    args: List[str] = Field(default_factory=list, description="Usually empty for these operators.")
+    closure_lines: List[str] = Field(default_factory=list, max_length=0)
 
 # --- Category 5: Pairing Operators (MUST have (...) args, OPTIONAL closure) ---
 class HybridPairingOperator(BaseModel):
@@ -148,21 +204,58 @@ class HybridPairingOperator(BaseModel):
     )
     
     closure_lines: List[str] = Field(
-        default=[],
+        default_factory=list,
         description="Optional closure to define the matching key."
     )
 
 ChainOperator = Union[LogicOperator, ParametricOperator, FlexibleOperator, StructuralOperator, HybridPairingOperator]
 
-class VarArg(BaseModel):
+def _validate_tagged(items, key, models, label):
+    """
+    Validates each raw dict in `items` against the one model its `key` tag names,
+    instead of letting a Union try every member in turn. Untagged/unknown items are
+    left for the Union (and its full error) to handle.
+    """
+    if not isinstance(items, list): return items
+    out = []
+    for i, item in enumerate(items):
+        if isinstance(item, dict):
+            tag = item.get(key)
+            model = models.get(tag) if isinstance(tag, str) else None
+            if model:
+                try:
+                    item = model.model_validate(item)
+                except ValidationError as e:
+                    details = "; ".join(
+                        f"{'.'.join(map(str, err['loc'])) or tag}: {err['msg']}" for err in e.errors()
+                    )
+                    raise ValueError(f"{label} {i} ('{tag}'): {details}")
+        out.append(item)
+    return out
+
+# operator name -> model, so a chain step is validated once against the right model
+# instead of being tried against every union member in turn
+_OPERATOR_MODELS = {
+    op: model
+    for model in get_args(ChainOperator)
+    for op in get_args(model.model_fields['operator'].annotation)
+}
+
+# Argument leaves are plain slotted dataclasses: no validators of their own,
+# and built in bulk by ArgumentParser, so skip the BaseModel machinery.
+# Pydantic still validates them (and emits the same schema) as fields of ProcessCall.
+@dataclass(slots=True, frozen=True, kw_only=True)
+class VarArg:
     type: Literal["variable"] = "variable"
-    name: str = Field(..., description="The variable name.")
+    name: Annotated[str, Field(description="The variable name.")]
 
-class StringArg(BaseModel):
+@dataclass(slots=True, frozen=True, kw_only=True)
+class StringArg:
     type: Literal["string"] = "string"
-    value: str = Field(..., description="The string value. Do NOT add quotes; renderer will add them.")
+    value: Annotated[str, Field(description="The string value. Do NOT add quotes; renderer will add them.")]
 
-class NumericArg(BaseModel):
+@dataclass(slots=True, frozen=True, kw_only=True)
+class NumericArg:
     type: Literal["numeric"] = "numeric"
     value: Union[int, float, bool]
 
@@ -181,6 +274,11 @@ class ChannelChain(BaseModel):
         description="Variable to set at the end. LEAVE EMPTY if this chain flows into a process input."
     )
 
+    @field_validator('steps', mode='before')
+    def dispatch_operators(cls, v):
+        """Routes each raw step to its operator model; unknown operators fall through to the union."""
+        return _validate_tagged(v, 'operator', _OPERATOR_MODELS, "Step")
+
     @field_validator('start_variable')
     def validate_source_syntax(cls, v):
         v = v.strip()
@@ -188,24 +286,20 @@ class ChannelChain(BaseModel):
         
         # 1. Channel Factories (Strict Allow List)
         if v.startswith("Channel."):
-            valid_factories = {
-                "Channel.fromPath", "Channel.fromFilePairs", "Channel.of", 
-                "Channel.value", "Channel.fromSRA", "Channel.empty", "Channel.fromList",
-                "Channel.topic"
-            }
-            factory = v.split('(')[0].strip()
-            if factory not in valid_factories:
-                raise ValueError(f"Unknown Channel factory: '{factory}'. Supported: {valid_factories}")
+            factory = v.partition('(')[0].strip()
+            if factory not in _VALID_FACTORIES:
+                raise ValueError(f"Unknown Channel factory: '{factory}'. Supported: {_VALID_FACTORIES_STR}")
             return v
             
         # 2. Variable Names (simple identifiers) or Param access
         # Matches: "trimmed", "params.reads", "step1_out"
-        if re.match(r'^[a-zA-Z_][\w]*(\.[a-zA-Z_][\w]*)*$', v):
-            return v
+        # (interned: scope checks compare these against assign_to/set_variable names)
+        if _DOTTED_IDENT_RE.match(v):
+            return sys.intern(v)
             
         # 3. Function Calls
         # Matches: "getReads()", "collectFile(name: 'x')"
-        if re.match(r'^[a-zA-Z_][\w]*\(.*\)$', v):
+        if _FUNC_CALL_RE.match(v):
             return v
             
         raise ValueError(f"Invalid start_variable format: '{v}'. Must be a variable, param, or Channel.* factory.")
@@ -223,6 +317,8 @@ class ChannelChain(BaseModel):
 
 ProcessArgument = Union[VarArg, StringArg, NumericArg]
 
+_BOOL_NULL = {'true': True, 'false': False, 'null': None}
+
 class ArgumentParser(BaseModel):
     @classmethod
     def parse(cls, v: Any) -> ProcessArgument:
@@ -230,20 +326,25 @@ class ArgumentParser(BaseModel):
         if isinstance(v, dict) and 'type' in v:
             return v
         
-        # If it's a raw string, we infer the type
+        # If it's a raw string, we infer the type (the first char decides most cases)
         if isinstance(v, str):
             v = v.strip()
+            if not v: return VarArg(name=v)
+            c0 = v[0]
             # Check for quotes = String
-            if (v.startswith("'") and v.endswith("'")) or (v.startswith('"') and v.endswith('"')):
-                return {"type": "string", "value": v[1:-1]}
+            if (c0 == "'" or c0 == '"') and v[-1] == c0:
+                return StringArg(value=v[1:-1])
             # Check for numeric
-            if v.isdigit() or v.lower() in ['true', 'false', 'null']:
-                # Let Pydantic cast it later, or handle strict bools here
-                val = True if v.lower() == 'true' else False if v.lower() == 'false' else None
-                if val is None and v.lower() != 'null': val = int(v) 
-                return {"type": "numeric", "value": val if val is not None else 0}
+            if v.isdigit():
+                return NumericArg(value=int(v))
+            # Only strings up to len('false') can be a bool/null literal
+            if len(v) <= 5:
+                lv = v.lower()
+                if lv in _BOOL_NULL:
+                    val = _BOOL_NULL[lv]
+                    return NumericArg(value=val if val is not None else 0)
             # Default = Variable
-            return {"type": "variable", "name": v}
+            return VarArg(name=sys.intern(v))
         
         return v
 
@@ -253,7 +354,7 @@ class ProcessCall(BaseModel):
     process_name: str = Field(..., description="Name of process. MUST match an Import or Inline Process.")
 
     args: List[ProcessArgument] = Field(
-        default=[], 
+        default_factory=list, 
         description="List of inputs. Select 'variable' for channels, 'string' for text options."
     )
     
@@ -264,6 +365,11 @@ class ProcessCall(BaseModel):
     # 2. 'output_attribute' handles the '.out.channelName' pattern.
     output_attribute: Optional[str] = Field(None, description="Specific named output to extract (e.g., 'bam' implies accessing '.out.bam').")
 
+    @field_validator('process_name', 'assign_to')
+    def intern_names(cls, v):
+        # Names end up in scope sets and sub-workflow lookups; share one object per name
+        return sys.intern(v) if v else v
+
     @field_validator('args', mode='before')
     def allow_lazy_args(cls, v):
         """
@@ -314,7 +420,7 @@ class ProcessCall(BaseModel):
         """
         if self.assign_to:
             # Must start with letter, only alphanumeric + underscores
-            if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', self.assign_to):
+            if not _is_simple_ident(self.assign_to):
                  raise ValueError(
                      f"INVALID VARIABLE NAME: '{self.assign_to}'.\n"
                      f"Groovy variable names must start with a letter and contain only alphanumerics or underscores."
@@ -322,6 +428,8 @@ class ProcessCall(BaseModel):
         return self
 
 class Assignment(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     type: Literal["assignment"] = "assignment"
     variable: str
     value: str
@@ -330,34 +438,58 @@ class Assignment(BaseModel):
     def forbid_hidden_logic(cls, v):
         if "step_" in v and "(" in v:
             raise ValueError(f"Use 'ProcessCall' node type for step execution '{v}', not Assignment.")
-        if ".map" in v or ".cross" in v:
+        if _HIDDEN_CHAIN_RE.search(v):
             raise ValueError(f"Use 'ChannelChain' node type for logic '{v}', not Assignment.")
         return v
 
+# Chars that may precede '=' in a comparison operator (== != >= <=)
+_EQ_PREFIX = frozenset('=!<>')
+
 class ConditionalBlock(BaseModel):
     type: Literal["conditional"] = "conditional"
     condition: str = Field(..., description="The condition string, e.g. '!params.skip_mapping'")
     # Recursive definition: A block contains statements, which can be calls, chains, or nested conditionals
     body: List[Union[ProcessCall, ChannelChain, Assignment, 'ConditionalBlock']] = Field(..., description="Logic to execute if true")
 
+    @field_validator('body', mode='before')
+    def dispatch_statements(cls, v):
+        return _validate_tagged(v, 'type', _STATEMENT_MODELS, "Statement")
+
     @field_validator('condition')
     def validate_groovy_condition(cls, v):
         v = v.strip()
         if not v:
             raise ValueError("Condition string cannot be empty.")
+
+        # Fast path: flag checks like "params.skip_qc" / "!params.x" have nothing to scan
+        if '=' not in v and '(' not in v and ')' not in v:
+            return v
             
-        # Basic Heuristic Check for Groovy Syntax
-        # 1. Parentheses balance (simple check)
-        if v.count('(') != v.count(')'):
-             raise ValueError(f"SYNTAX ERROR: Unbalanced parentheses in condition: '{v}'")
-             
+        # Basic Heuristic Check for Groovy Syntax, in a single scan:
+        # 1. Parentheses balance (never closing more than is open)
         # 2. Block commonly misused characters that break strict Nextflow
-        # e.g., using single '=' for comparison (common beginner mistake)
-        # We try to catch "if (x = 5)" which is assignment, not comparison "=="
-        # This regex looks for = surrounded by spaces/vars, but not ==, !=, >=, <=
-        import re
-        # This is a heuristic; might flag valid complex cases, but safe for 99% of pipelines
-        if re.search(r'(?<!=)[^!<>]=\s', v) or re.search(r'\s=[^=]', v):
+        #    e.g., using single '=' for comparison (common beginner mistake)
+        #    We try to catch "if (x = 5)" which is assignment, not comparison "=="
+        #    A lone '=' is one not part of ==, !=, >=, <= (or Groovy's =~ / ==~)
+        depth = 0
+        lone_eq = False
+        prev = ''
+        n = len(v)
+        for i, c in enumerate(v):
+            if c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+                if depth < 0: break
+            elif c == '=' and not lone_eq and prev not in _EQ_PREFIX:
+                nxt = v[i + 1] if i + 1 < n else ''
+                lone_eq = nxt != '=' and nxt != '~'
+            prev = c
+
+        if depth:
+             raise ValueError(f"SYNTAX ERROR: Unbalanced parentheses in condition: '{v}'")
+
+        if lone_eq:
              # We warn, or strictly fail. For this AST, let's warn via error to prompt a fix.
              # Exception: param assignment inside if? No, usually bad practice in workflow logic.
              raise ValueError(
@@ -373,7 +505,18 @@ Statement = Union[ProcessCall, ChannelChain, Assignment, ConditionalBlock]
 EntrypointStatement = Union[ProcessCall, Assignment, ConditionalBlock]
 ModuleStatement = Union[ProcessCall, ChannelChain, Assignment, ConditionalBlock]
 
+# `type` tag -> model for the statement unions above (see _validate_tagged)
+_STATEMENT_MODELS = {
+    'process_call': ProcessCall,
+    'channel_chain': ChannelChain,
+    'assignment': Assignment,
+    'conditional': ConditionalBlock,
+}
+_ENTRYPOINT_MODELS = {t: m for t, m in _STATEMENT_MODELS.items() if t != 'channel_chain'}
+
 class EmitItem(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     export_name: str = Field(
         ..., 
         description="The public name exposed by the workflow (e.g., 'bam'). Must be a simple identifier (no dots)."
@@ -393,13 +536,13 @@ class EmitItem(BaseModel):
         """
         # If the user tries to put a dot here, we will try to fix it in the model_validator below.
         # But if it persists, this regex is the final guard.
-        if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', v):
+        if not _is_simple_ident(v):
             raise ValueError(
                 f"SYNTAX ERROR: Invalid export name '{v}'.\n"
                 f"Workflow output keys must be simple identifiers (e.g., 'consensus').\n"
                 f"They CANNOT contain dots."
             )
-        return v
+        return sys.intern(v)
 
     @field_validator('internal_variable')
     def validate_internal_source(cls, v):
@@ -409,7 +552,7 @@ class EmitItem(BaseModel):
         if not v: raise ValueError("Internal variable path cannot be empty.")
 
         # Internal paths allow dots: 'PROCESS_NAME.out.CHANNEL'
-        if not re.match(r'^[a-zA-Z_][\w\.]*$', v):
+        if not _is_dotted_path(v):
              raise ValueError(
                  f"SYNTAX ERROR: Invalid internal variable path '{v}'.\n"
                  f"Must be a valid variable or property path (e.g., 'fastqc_ch' or 'FASTQC.out.zip')."
@@ -428,9 +571,8 @@ class EmitItem(BaseModel):
 
         # If export has dots and internal is missing, we assume shorthand intent.
         if '.' in export and not internal:
-            parts = export.split('.')
             # The last part becomes the public name (e.g. 'out')
-            new_export = parts[-1]
+            new_export = export.rpartition('.')[2]
             # The full string becomes the source
             values['export_name'] = new_export
             values['internal_variable'] = export
@@ -451,80 +593,101 @@ class EmitItem(BaseModel):
         
 # --- 3. WORKFLOW DEFINITIONS ---
 
+# Names each statement type defines in its workflow scope, keyed on the exact class
+def _harvest_assignment(stmt, defined):
+    defined.add(stmt.variable)
+
+def _harvest_process_call(stmt, defined):
+    if stmt.assign_to: defined.add(stmt.assign_to)
+    defined.add(stmt.process_name) # Process object itself is valid
+
+def _harvest_channel_chain(stmt, defined):
+    if stmt.set_variable: defined.add(stmt.set_variable)
+
+_HARVEST = {
+    Assignment: _harvest_assignment,
+    ProcessCall: _harvest_process_call,
+    ChannelChain: _harvest_channel_chain,
+}
+
 class NextflowProcess(BaseModel):
     """Raw Bash/Script Processes (step_* are NOT allowed here)"""
     name: str
     container: Optional[str] = None
-    input_declarations: List[str] = Field(default=[])
-    output_declarations: List[str] = Field(default=[])
+    input_declarations: List[str] = Field(default_factory=list)
+    output_declarations: List[str] = Field(default_factory=list)
     script_block: str
 
     @field_validator('script_block')
     def validate_no_dsl(cls, v):
-        # Forbidden keywords that imply DSL2 logic inside a bash script
-        forbidden = ['workflow', '.cross(', '.join(', '.multiMap', '.map{', '.mix(']
-        for kw in forbidden:
-            if kw in v:
-                raise ValueError(
-                    f"INVALID PROCESS CONTENT: Found DSL2 keyword '{kw}' inside a Process script.\n"
-                    f"Processes are for BASH/SHELL commands only.\n"
-                    f"If you need logic, define this as a 'sub_workflow', not a 'process'."
-                )
+        # Forbidden keywords that imply DSL2 logic inside a bash script (one pass)
+        match = _FORBIDDEN_DSL_RE.search(v)
+        if match:
+            raise ValueError(
+                f"INVALID PROCESS CONTENT: Found DSL2 keyword '{match.group(0)}' inside a Process script.\n"
+                f"Processes are for BASH/SHELL commands only.\n"
+                f"If you need logic, define this as a 'sub_workflow', not a 'process'."
+            )
         return v
     
     @field_validator('name')
     def validate_name(cls, v):
-        if v.startswith("step_"):
+        if v[:5] == "step_":
             raise ValueError(f"Process name '{v}' starts with 'step_'. Standard tools must be imported, not defined inline.")
-        if v.isupper():
+        # A lowercase first char already rules out an all-caps name; skip the full scan
+        if not v[:1].islower() and v.isupper():
              raise ValueError(f"Process '{v}' is UPPERCASE. It should likely be a Global Constant, not a Process.")
         return v
 
 class NextflowWorkflow(BaseModel):
     """Used for Main Workflow AND Sub-Workflows"""
     name: str
-    take_channels: List[str] = Field(default=[])
+    take_channels: List[str] = Field(default_factory=list)
     body: List[ModuleStatement]
-    emit_channels: List[EmitItem] = Field(default=[])
+    emit_channels: List[EmitItem] = Field(default_factory=list)
 
-    @model_validator(mode='after')
-    def auto_fix_emits(self):
-        """Converts inline 'output_attribute' usage into proper 'emit' statements."""
-        for stmt in self.body:
-            if isinstance(stmt, ProcessCall):
-                if stmt.output_attribute and not stmt.assign_to:
-                    internal = f"{stmt.process_name}.out.{stmt.output_attribute}"
-                    export = "out" if stmt.output_attribute == '*' else stmt.output_attribute
-                    
-                    if not any(e.export_name == export for e in self.emit_channels):
-                        self.emit_channels.append(EmitItem(export_name=export, internal_variable=internal))
-                    
-                    stmt.output_attribute = None
-        return self
+    @field_validator('body', mode='before')
+    def dispatch_statements(cls, v):
+        return _validate_tagged(v, 'type', _STATEMENT_MODELS, "Statement")
 
     @model_validator(mode='after')
     def validate_and_prune_scope(self):
         """
-        Ensures all emitted variables exist. 
-        Instead of crashing, it REMOVES invalid emits to ensure the AST remains parseable.
+        One pass over the body that:
+        - Converts inline 'output_attribute' usage into proper 'emit' statements.
+        - Ensures all emitted variables exist. 
+          Instead of crashing, it REMOVES invalid emits to ensure the AST remains parseable.
         """
         defined = set(self.take_channels)
-        
-        # 1. Harvest definitions from body
+        exported = {e.export_name for e in self.emit_channels}
+        auto_emits = []
+
+        # 1. Harvest definitions from body (and lift inline outputs to emits)
         for stmt in self.body:
-            if isinstance(stmt, Assignment):
-                defined.add(stmt.variable)
-            elif isinstance(stmt, ProcessCall):
-                if stmt.assign_to: defined.add(stmt.assign_to)
-                defined.add(stmt.process_name) # Process object itself is valid
-            elif isinstance(stmt, ChannelChain) and stmt.set_variable:
-                defined.add(stmt.set_variable)
+            stmt_cls = type(stmt)
+            harvest = _HARVEST.get(stmt_cls)
+            if harvest: harvest(stmt, defined)
+
+            if stmt_cls is ProcessCall and stmt.output_attribute and not stmt.assign_to:
+                export = "out" if stmt.output_attribute == '*' else stmt.output_attribute
+
+                if export not in exported:
+                    exported.add(export)
+                    internal = f"{stmt.process_name}.out.{stmt.output_attribute}"
+                    if _is_simple_ident(export) and _is_dotted_path(internal):
+                        # Both fields already pass EmitItem's validators; skip re-running them
+                        auto_emits.append(EmitItem.model_construct(export_name=export, internal_variable=internal))
+                    else:
+                        auto_emits.append(EmitItem(export_name=export, internal_variable=internal))
+
+                stmt.output_attribute = None
 
         # 2. Check Emits and Filter Invalid Ones
+        # (auto emits are rooted at a called process, which is always defined)
         valid_emits = []
         for emit in self.emit_channels:
             target = emit.internal_variable or emit.export_name
-            root = target.split('.')[0]
+            root = target.partition('.')[0]
             
             if root in defined:
                 valid_emits.append(emit)
@@ -532,7 +695,7 @@ class NextflowWorkflow(BaseModel):
                 # Silently drop invalid emits to prevent crashes
                 pass
         
-        self.emit_channels = valid_emits
+        self.emit_channels = valid_emits + auto_emits
         return self
 
 class EntrypointWorkflow(BaseModel):
@@ -545,7 +708,7 @@ class EntrypointWorkflow(BaseModel):
     @field_validator('body', mode='before')
     def fix_lazy_process_calls(cls, v):
         # Re-use the logic from NextflowWorkflow
-        return repair_lazy_calls(v)
+        return _validate_tagged(repair_lazy_calls(v), 'type', _ENTRYPOINT_MODELS, "Statement")
 
     @model_validator(mode='after')
     def forbid_complex_logic(self):
@@ -560,6 +723,88 @@ class EntrypointWorkflow(BaseModel):
 
 # --- 4. MASTER AST ---
 
+def _clean_block(statements, parent_scope, inputs, inputs_set, sub_wf_names):
+    """
+    deduplicate_logic's body scrubber: drops calls to sub-workflows from the
+    main body and re-points out-of-scope call arguments at workflow inputs.
+    """
+    if not isinstance(statements, list): return statements
+
+    root = []
+    # Explicit stack instead of recursion: one frame per open conditional body.
+    # Frame: (statement iterator, scope, cleaned list, owning conditional, parent's cleaned list)
+    stack = [(iter(statements), set(parent_scope), root, None, None)]
+
+    while stack:
+        stmts, current_scope, cleaned, owner, parent_cleaned = stack[-1]
+
+        for stmt in stmts:
+            if not isinstance(stmt, dict): continue
+            t = stmt.get('type')
+            
+            if t == 'conditional':
+                body = stmt.get('body', [])
+                if isinstance(body, list):
+                    # Descend; this conditional is kept/dropped once its body is done
+                    stack.append((iter(body), set(current_scope), [], stmt, cleaned))
+                    break
+                stmt['body'] = body
+                if body: 
+                    cleaned.append(stmt)
+                continue
+
+            is_chain = t == 'channel_chain' or 'start_variable' in stmt
+            is_call  = t == 'process_call' or 'process_name' in stmt
+
+            if is_chain:
+                name = stmt.get('set_variable')
+                if name: current_scope.add(name)
+            if is_call:
+                name = stmt.get('assign_to')
+                if name: current_scope.add(name)
+            if t == 'assignment':
+                name = stmt.get('variable')
+                if name: current_scope.add(name)
+
+            if is_call and inputs:
+                if stmt.get('process_name') in sub_wf_names: 
+                    continue
+
+            if is_call:
+                args = stmt.get('args', [])
+                new_args = []
+                for i, arg in enumerate(args):
+                    arg_val = str(arg.get('name') or arg.get('value') or "") if isinstance(arg, dict) else str(arg)
+                    match_root = _ROOT_VAR_RE.match(arg_val)
+                    root_var = match_root.group(1) if match_root else arg_val
+
+                    if root_var in current_scope or root_var in inputs_set:
+                        new_args.append(arg)
+                    else:
+                        match = next((inp for inp in inputs if inp in arg_val), None)
+                        
+                        if not match and i < len(inputs): 
+                            match = inputs[i]
+                        
+                        if match:
+                            new_args.append({"type": "variable", "name": match})
+                        else:
+                            new_args.append(arg)
+                        
+                stmt['args'] = new_args
+                if 'type' not in stmt: stmt['type'] = 'process_call'
+                
+            cleaned.append(stmt)
+        else:
+            # Body exhausted: close the frame and attach it to its conditional
+            stack.pop()
+            if owner is not None:
+                owner['body'] = cleaned
+                if cleaned:
+                    parent_cleaned.append(owner)
+    return root
+
+
 class NextflowPipelineAST(BaseModel):
     imports: List[ImportItem] = Field(default_factory=list)
     globals: List[GlobalDef] = Field(
@@ -568,11 +813,11 @@ class NextflowPipelineAST(BaseModel):
     )
 
     # 1. Bash Scripts
-    processes: List[NextflowProcess] = Field(default=[])
+    processes: List[NextflowProcess] = Field(default_factory=list)
 
     # 2. Helper Workflows (e.g. prepare_inputs)
     sub_workflows: List[NextflowWorkflow] = Field(
-        default=[], 
+        default_factory=list, 
         description="Helper workflows containing DSL logic (cross, map, etc). NOT processes."
     )
 
@@ -585,73 +830,17 @@ class NextflowPipelineAST(BaseModel):
     @model_validator(mode='before')
     def deduplicate_logic(cls, values: Dict[str, Any]) -> Dict[str, Any]:
         main_wf = values.get('main_workflow')
-        sub_wfs = values.get('sub_workflows', [])
+        sub_wfs = values.get('sub_workflows') or ()
         
+        # Fast path: without sub-workflows there is nothing to deduplicate
         if not sub_wfs or not isinstance(main_wf, dict): return values
         
         inputs = main_wf.get('take_channels', [])
         if not isinstance(inputs, list): inputs = []
+        inputs_set = set(inputs)
         sub_wf_names = {s.get('name') for s in sub_wfs if isinstance(s, dict) and 'name' in s}
 
-        def clean_block(statements, parent_scope):
-            if not isinstance(statements, list): return statements
-            
-            current_scope = set(parent_scope)
-            cleaned = []
-            
-            for stmt in statements:
-                if not isinstance(stmt, dict): continue
-                
-                if stmt.get('type') == 'conditional':
-                    stmt['body'] = clean_block(stmt.get('body', []), current_scope)
-                    if stmt['body']: 
-                        cleaned.append(stmt)
-                    continue
-
-                is_chain = stmt.get('type') == 'channel_chain' or 'start_variable' in stmt
-                is_call  = stmt.get('type') == 'process_call' or 'process_name' in stmt
-                is_assign = stmt.get('type') == 'assignment'
-
-                if is_chain and stmt.get('set_variable'):
-                    current_scope.add(stmt.get('set_variable'))
-                if is_call and stmt.get('assign_to'):
-                    current_scope.add(stmt.get('assign_to'))
-                if is_assign and stmt.get('variable'):
-                    current_scope.add(stmt.get('variable'))
-
-                if is_call and inputs:
-                    if stmt.get('process_name') in sub_wf_names: 
-                        continue
-
-                if is_call:
-                    args = stmt.get('args', [])
-                    new_args = []
-                    for i, arg in enumerate(args):
-                        arg_val = str(arg.get('name') or arg.get('value') or "") if isinstance(arg, dict) else str(arg)
-                        import re
-                        match_root = re.match(r'^([a-zA-Z_][a-zA-Z0-9_]*)', arg_val)
-                        root_var = match_root.group(1) if match_root else arg_val
-
-                        if root_var in current_scope or root_var in inputs:
-                            new_args.append(arg)
-                        else:
-                            match = next((inp for inp in inputs if inp in arg_val), None)
-                            
-                            if not match and i < len(inputs): 
-                                match = inputs[i]
-                            
-                            if match:
-                                new_args.append({"type": "variable", "name": match})
-                            else:
-                                new_args.append(arg)
-                            
-                    stmt['args'] = new_args
-                    if 'type' not in stmt: stmt['type'] = 'process_call'
-                    
-                cleaned.append(stmt)
-            return cleaned
-
-        main_wf['body'] = clean_block(main_wf.get('body', []), set(inputs))
+        main_wf['body'] = _clean_block(main_wf.get('body', []), set(inputs), inputs, inputs_set, sub_wf_names)
         values['main_workflow'] = main_wf
         return values
 
@@ -680,7 +869,6 @@ class NextflowPipelineAST(BaseModel):
         return self
     
 # --- REBUILD MODELS FOR RECURSION ---
+# Only ConditionalBlock refers to itself by name; the other models have no
+# forward refs and are already complete when their class body finishes.
 ConditionalBlock.model_rebuild()
-NextflowProcess.model_rebuild()
-NextflowWorkflow.model_rebuild()
-EntrypointWorkflow.model_rebuild()
\ No newline at end of file
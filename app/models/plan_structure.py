@@ -18,9 +18,9 @@ class LogicStep(BaseModel):
 class PipelinePlan(BaseModel):
     strategy_selector: Literal["EXACT_MATCH", "ADAPTED_MATCH", "CUSTOM_BUILD"] = Field(...)
     used_template_id: Optional[str] = Field(None, description="Parent template ID if applicable.")
-    components: List[ComponentDef] = Field(default=[], description="List of tools.")
-    workflow_logic: List[LogicStep] = Field(default=[], description="Logic flow.")
-    global_params: Dict[str, str] = Field(default={})
+    components: List[ComponentDef] = Field(default_factory=list, description="List of tools.")
+    workflow_logic: List[LogicStep] = Field(default_factory=list, description="Logic flow.")
+    global_params: Dict[str, str] = Field(default_factory=dict)
 
     model_config = ConfigDict(
         json_schema_extra={
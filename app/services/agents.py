@@ -1,9 +1,14 @@
-import json
+import hashlib
+import threading
+import orjson
+from cachetools import TTLCache
 from langchain_core.prompts import ChatPromptTemplate
+from app.core.config import settings
+from app.core.loader import data_loader
 from app.models.plan_structure import PipelinePlan
 from app.models.ast_structure import NextflowPipelineAST
 from app.services.llm import get_llm
-from app.services.tools import retrieve_rag_context
+from app.services.tools import aretrieve_rag_context
 from app.services.graph_state import GraphState
 
 # --- PROMPTS ---
@@ -157,61 +162,118 @@ Before outputting JSON, verify:
 4.  **Syntax:** Do `process_name`s match their imports?
 """
 
+# Parsed once at import; the nodes only fill in the placeholders.
+_PLANNER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", PLANNER_SYSTEM_PROMPT),
+    ("human", "REQUEST: {query}\n\nAVAILABLE TOOLS:\n{context}")
+])
+
+# Human turn as separate content parts, slowest-changing first: the technical
+# context (tool docs/templates) is shared by many queries, so it belongs in the
+# reusable prefix ahead of the plan and the raw request.
+_ARCHITECT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", ARCHITECT_SYSTEM_PROMPT),
+    ("human", [
+        {"type": "text", "text": "# 1. TECHNICAL CONTEXT: {tech_context}"},
+        {"type": "text", "text": "# 2. DESIGN PLAN: {plan}\n# 3. USER PROMPT: {user_query}"}
+    ])
+])
+
+# Successful plan / AST dumps keyed on a hash of everything in the prompt
+# (nodes run on worker threads, so access goes through the lock)
+# Entries are orjson bytes: every hit decodes a fresh object, so nothing
+# downstream can mutate what later requests will be served
+llm_cache = TTLCache(maxsize=settings.LLM_CACHE_SIZE, ttl=settings.LLM_CACHE_TTL)
+_llm_cache_lock = threading.Lock()
+
+def _cache_key(node: str, *parts: str) -> str:
+    h = hashlib.blake2b(node.encode())
+    for part in parts:
+        h.update(b"\x00")
+        h.update(part.encode())
+    return h.hexdigest()
+
 # --- NODES ---
 
-def planner_node(state: GraphState):
+async def planner_node(state: GraphState):
     print("--- [NODE] PLANNER ---")
     llm = get_llm()
     
     # 1. Retrieve Metadata
-    metadata_context = retrieve_rag_context(state['user_query'], embed_code=False)
+    # Awaited, so the event loop keeps serving other requests during retrieval and the LLM call
+    metadata_context = await aretrieve_rag_context(state.user_query, embed_code=False)
 
     print("context: ", metadata_context)
 
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", PLANNER_SYSTEM_PROMPT),
-        ("human", "REQUEST: {query}\n\nAVAILABLE TOOLS:\n{context}")
-    ])
+    cache_key = _cache_key("planner", state.user_query, metadata_context)
+    with _llm_cache_lock:
+        cached = llm_cache.get(cache_key)
+    if cached is not None:
+        print("Agent 1 Output (cached)")
+        return {"design_plan": orjson.loads(cached)}
 
     planner = llm.with_structured_output(PipelinePlan)
-    chain = prompt | planner
+    chain = _PLANNER_PROMPT | planner
 
     try:
-        plan = chain.invoke({"query": state['user_query'], "context": metadata_context})
-        print("Agent 1 Output:", plan.model_dump())
-        return {"design_plan": plan.model_dump()}
+        plan = await chain.ainvoke({"query": state.user_query, "context": metadata_context})
+        design_plan = plan.model_dump()
+        print("Agent 1 Output:", design_plan)
+        with _llm_cache_lock:
+            llm_cache[cache_key] = orjson.dumps(design_plan)
+        return {"design_plan": design_plan}
     except Exception as e:
         return {"error": f"Planner failed: {str(e)}"}
 
+def route_plan(state: GraphState):
+    """EXACT_MATCH plans with a prebuilt template AST skip hydrator + architect."""
+    plan = state.design_plan
+    if state.error or plan.get('strategy_selector') != "EXACT_MATCH": return "hydrate"
+    return "materialize" if plan.get('used_template_id') in data_loader.template_asts else "hydrate"
+
+def template_materializer_node(state: GraphState):
+    print("--- [NODE] TEMPLATE MATERIALIZER ---")
+    tmpl_id = state.design_plan['used_template_id']
+    try:
+        ast = NextflowPipelineAST.model_validate(data_loader.template_asts[tmpl_id])
+        return {"ast_json": ast.model_dump(), "validation_error": None}
+    except Exception as e:
+        return {"error": f"Template AST '{tmpl_id}' is invalid: {str(e)}"}
+
 def architect_node(state: GraphState):
     print("--- [NODE] ARCHITECT ---")
-    if state.get("error"): return {"error": state['error']}
+    if state.error: return {"error": state.error}
     
     llm = get_llm()
     architect = llm.with_structured_output(NextflowPipelineAST, method="json_schema", include_raw=False)
 
-    if not state.get("messages"):
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", ARCHITECT_SYSTEM_PROMPT),
-            ("human", """
-            # 1. USER PROMPT: {user_query}
-            # 2. DESIGN PLAN: {plan}
-            # 3. TECHNICAL CONTEXT: {tech_context}
-            """)
-        ])
-        
-        messages = prompt.invoke({
-            "user_query": state['user_query'],
-            "plan": json.dumps(state['design_plan'], indent=2),
-            "tech_context": state['technical_context']
+    # Repair turns always go to the model; only the first attempt is cacheable
+    cache_key = None
+    if not state.messages:
+        # Compact form: indentation is only extra input tokens for the model
+        plan_json = orjson.dumps(state.design_plan).decode()
+        cache_key = _cache_key("architect", state.user_query, plan_json, state.technical_context)
+        with _llm_cache_lock:
+            cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return {"ast_json": orjson.loads(cached), "validation_error": None}
+
+        messages = _ARCHITECT_PROMPT.invoke({
+            "user_query": state.user_query,
+            "plan": plan_json,
+            "tech_context": state.technical_context
         }).to_messages()
     else:
-        messages = state["messages"]
+        messages = state.messages
 
     try:
         result = architect.invoke(messages)
+        ast_json = result.model_dump()
+        if cache_key is not None:
+            with _llm_cache_lock:
+                llm_cache[cache_key] = orjson.dumps(ast_json)
         return {
-            "ast_json": result.model_dump(),
+            "ast_json": ast_json,
             "validation_error": None,
             "messages": messages
         }
@@ -219,6 +281,6 @@ def architect_node(state: GraphState):
         print(f"Architect Failed: {str(e)}")
         return {
             "validation_error": str(e),
-            "retries": state.get("retries", 0) + 1,
+            "retries": state.retries + 1,
             "messages": messages
         }
\ No newline at end of file
@@ -1,15 +1,17 @@
-from typing import TypedDict, List, Optional, Dict
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict
 from langchain_core.messages import BaseMessage
 
-class GraphState(TypedDict):
-    user_query: str
-    rag_context: str
-    design_plan: Dict
-    technical_context: str
-    messages: List[BaseMessage]
-    ast_json: Optional[Dict]
-    validation_error: Optional[str]
-    retries: int
+@dataclass(slots=True)
+class GraphState:
+    user_query: str = ""
+    rag_context: str = ""
+    design_plan: Dict = field(default_factory=dict)
+    technical_context: str = ""
+    messages: List[BaseMessage] = field(default_factory=list)
+    ast_json: Optional[Dict] = None
+    validation_error: Optional[str] = None
+    retries: int = 0
     nextflow_code: str = ""
     mermaid_code: str = ""
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
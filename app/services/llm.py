@@ -1,20 +1,28 @@
 import os
-from langchain_mistralai import ChatMistralAI
+from functools import lru_cache
 from app.core.config import settings
 
-def get_llm():
-    """Returns the configured Mistral LLM instance."""
+@lru_cache(maxsize=4)
+def get_llm(model: str = settings.LLM_MODEL):
+    """
+    Returns the configured Mistral LLM instance.
+    Cached per model, so every node (and every request) reuses one client
+    and its HTTP connection pool instead of re-creating them.
+    """
 
     api_key = os.getenv("MISTRAL_API_KEY")
     if not api_key:
         print("❌ CRITICAL ERROR: MISTRAL_API_KEY is missing from environment variables!")
         # We raise an error here so the node catches it and prints the traceback
+        # (lru_cache does not cache exceptions, so a later call re-checks the env)
         raise ValueError("MISTRAL_API_KEY is not set.")
-    
+
+    # Deferred: langchain_mistralai is only needed once a node actually calls the model
+    from langchain_mistralai import ChatMistralAI
     return ChatMistralAI(
-        model=settings.LLM_MODEL,
+        model=model,
         api_key=api_key,
         temperature=0.1,
         max_tokens=128000, 
         top_p=0.9,
-    )
\ No newline at end of file
+    )
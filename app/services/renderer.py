@@ -1,16 +1,76 @@
+import os
 import re
 import hashlib
-from jinja2 import Template
+import itertools
+from functools import lru_cache
 from typing import Any, Dict, Union
+from app.core.config import settings
 from app.services.graph_state import GraphState
 from app.utils.rendering import NF_TEMPLATE_AST
 
+@lru_cache(maxsize=1)
+def _nf_template():
+    # jinja2 is imported and the DSL2 template compiled on first render, then reused.
+    # The bytecode cache lets later workers/restarts skip the ~30ms compile.
+    from jinja2 import DictLoader, Environment, FileSystemBytecodeCache
+    try:
+        if settings.JINJA_CACHE_DIR:
+            os.makedirs(settings.JINJA_CACHE_DIR, exist_ok=True)
+        env = Environment(
+            loader=DictLoader({"pipeline.nf": NF_TEMPLATE_AST}),
+            bytecode_cache=FileSystemBytecodeCache(settings.JINJA_CACHE_DIR),
+            autoescape=False,  # Groovy, not HTML
+            auto_reload=False
+        )
+        return env.get_template("pipeline.nf")
+    except (OSError, RuntimeError) as e:
+        # Unwritable cache dir: compile in-process only
+        print(f"⚠️ Jinja Bytecode Cache Error: {e}")
+        return Environment(autoescape=False).from_string(NF_TEMPLATE_AST)
+
+_MULTI_BLANK_RE = re.compile(r'\n{3,}')
+
+# --- MERMAID CONSTANTS ---
+_CLEAN_ID_RE = re.compile(r'[^a-zA-Z0-9_]')
+_VAR_TOKEN_RE = re.compile(r'\b([a-zA-Z_][\w\.]*)\b')
+
+_MERMAID_KEYWORDS = frozenset({'end', 'subgraph', 'classDef', 'direction', 'style', 'linkStyle', 'callback', 'click'})
+_IGNORE_KEYWORDS = frozenset({
+    'mix', 'join', 'groupTuple', 'collect', 'map', 'flatten', 'cross', 'multiMap',
+    'true', 'false', 'null', 'it', 'get', 'return', 'branch', 'file', 'extractKey',
+    'baseName', 'simpleName', 'id', 'size', 'exists', 'toInteger', 'toString', 'view'
+})
+
+_MERMAID_HEADER = (
+    "flowchart TD",
+    "    classDef process fill:#e1f5fe,stroke:#01579b,stroke-width:2px;",
+    "    classDef subworkflow fill:#e8eaf6,stroke:#3f51b5,stroke-width:2px,stroke-dasharray: 5 5;",
+    "    classDef operator fill:#fff9c4,stroke:#fbc02d,stroke-width:2px,stroke-dasharray: 5 5;",
+    "    classDef data fill:#e0e0e0,stroke:#333,stroke-width:2px;",
+    "    classDef global fill:#f3e5f5,stroke:#7b1fa2,stroke-width:1px;",
+)
+
+@lru_cache(maxsize=4096)
+def make_id(name):
+    if not name: return "Unknown"
+    clean = _CLEAN_ID_RE.sub('_', str(name))
+
+    if clean in _MERMAID_KEYWORDS:
+        clean = f"{clean}_"
+
+    if len(clean) > 30 or not clean or clean[0].isdigit() or clean.startswith('_'):
+        h = hashlib.blake2b(str(name).encode(), digest_size=3).hexdigest()
+        return f"node_{h}"
+    return clean
+
 def render_nextflow_code(ast) -> str:
     """
     Renders the Nextflow AST into a DSL2 string.
     """
-    # 1. Convert Pydantic model to Dict if necessary
-    if hasattr(ast, 'model_dump'):
+    # 1. Convert Pydantic model to Dict if necessary (renderer_node already passes a dict)
+    if isinstance(ast, dict):
+        data = ast
+    elif hasattr(ast, 'model_dump'):
         data = ast.model_dump()
     elif hasattr(ast, 'dict'):
         data = ast.dict()
@@ -18,108 +78,101 @@ def render_nextflow_code(ast) -> str:
         data = ast
 
     # 2. Render Template
-    t = Template(NF_TEMPLATE_AST)
+    rendered = _nf_template().render(**data)
     
-    rendered = t.render(**data)
-    
-    while "\n\n\n" in rendered:
-        rendered = rendered.replace("\n\n\n", "\n\n")
-        
+    rendered = _MULTI_BLANK_RE.sub('\n\n', rendered)
+
     return rendered.strip()
 
+@lru_cache(maxsize=4096)
+def safe_get_label(text, fallback="?"):
+    """
+    Cleans text for Mermaid AND ensures it is never empty.
+    Empty labels like [""] cause syntax errors.
+    """
+    if text is None: return fallback
+    s = str(text)
+    if not s.strip(): return "''" # Render empty strings as visible ''
+    
+    # Escape backslashes first, then handle quotes and newlines
+    s = s.replace('\\', '\\\\')
+    return s.replace('\n', ' ').replace('"', "'")
+
+def _get_val(obj, key, default=None):
+    if obj is None: return default
+    if isinstance(obj, dict): 
+        return obj.get(key, default)
+    return getattr(obj, key, default)
+
+def _get_dict_val(obj, key, default=None):
+    # Dumped ASTs are dicts all the way down; raw strings/None fall back to default
+    try:
+        return obj.get(key, default)
+    except AttributeError:
+        return default
+
 def render_mermaid(ast: Union[Any, Dict[str, Any]]) -> str:
     # --- 1. HELPERS ---
-    def get_val(obj, key, default=None):
-        if obj is None: return default
-        if isinstance(obj, dict): 
-            return obj.get(key, default)
-        return getattr(obj, key, default)
-
-    def make_id(name):
-        if not name: return "Unknown"
-        clean = re.sub(r'[^a-zA-Z0-9_]', '_', str(name))
-        
-        keywords = {'end', 'subgraph', 'classDef', 'direction', 'style', 'linkStyle', 'callback', 'click'}
-        if clean in keywords:
-            clean = f"{clean}_"
-
-        if len(clean) > 30 or not clean or clean[0].isdigit() or clean.startswith('_'):
-            h = hashlib.md5(str(name).encode()).hexdigest()[:6]
-            return f"node_{h}"
-        return clean
-
-    def safe_get_label(text, fallback="?"):
-        """
-        Cleans text for Mermaid AND ensures it is never empty.
-        Empty labels like [""] cause syntax errors.
-        """
-        if text is None: return fallback
-        s = str(text)
-        if not s.strip(): return "''" # Render empty strings as visible ''
-        
-        # Escape backslashes first, then handle quotes and newlines
-        s = s.replace('\\', '\\\\')
-        return s.replace('\n', ' ').replace('"', "'")
+    # Pick the accessor once: renderer_node always passes a dumped dict
+    get_val = _get_dict_val if isinstance(ast, dict) else _get_val
+
+    def add_edge(src_id, target_node_id, label, lines, seen_edges, style):
+        edge_key = (src_id, target_node_id, label)
+        if edge_key in seen_edges: return
+        seen_edges.add(edge_key)
+        if label:
+            lines.append('    ' + src_id + ' -- "' + safe_get_label(label, "") + '" --> ' + target_node_id)
+        else:
+            lines.append('    ' + src_id + ' ' + style + ' ' + target_node_id)
+
+    def add_node(scope, *node_lines):
+        # Declaration plus any edges that only make sense with it, in one extend.
+        # Only a byte-identical repeat in the same subgraph is dropped: a changed
+        # label is re-emitted (Mermaid keeps the last) and a repeated block keeps its nodes.
+        key = (scope, node_lines)
+        if key in seen_nodes: return
+        seen_nodes.add(key)
+        lines.extend(node_lines)
 
     def resolve_variable_link(text_fragment, target_node_id, variable_registry, lines, seen_edges, style="-->"):
         if not isinstance(text_fragment, str): return 
 
-        root_candidate = text_fragment.split('.')[0] if "." in text_fragment else text_fragment
-        is_func_call = "(" in text_fragment and ")" in text_fragment
+        root_candidate, sep, rest = text_fragment.partition('.')
 
-        if root_candidate in variable_registry and not is_func_call and " " not in text_fragment:
-            src_id = variable_registry[root_candidate]
-            prop_name = text_fragment.split('.')[1] if "." in text_fragment else ""
+        # Registry lookup first: it rejects most fragments before any scan
+        src_id = variable_registry.get(root_candidate)
+        if src_id is not None and " " not in text_fragment and not ("(" in text_fragment and ")" in text_fragment):
+            prop_name = rest.partition('.')[0] if sep else ""
             label = f".{prop_name}" if prop_name else None
             
-            edge_key = f"{src_id}|{target_node_id}|{label}"
-            if edge_key not in seen_edges:
-                display_label = safe_get_label(label, "") if label else ""
-                arrow = f'-- "{display_label}" -->' if label else f'{style}'
-                lines.append(f'    {src_id} {arrow} {target_node_id}')
-                seen_edges.add(edge_key)
+            add_edge(src_id, target_node_id, label, lines, seen_edges, style)
             return
 
-        potential_vars = re.findall(r'\b([a-zA-Z_][\w\.]*)\b', text_fragment)
-        ignore_keywords = {
-            'mix', 'join', 'groupTuple', 'collect', 'map', 'flatten', 'cross', 'multiMap',
-            'true', 'false', 'null', 'it', 'get', 'return', 'branch', 'file', 'extractKey',
-            'baseName', 'simpleName', 'id', 'size', 'exists', 'toInteger', 'toString', 'view'
-        }
+        # A bare name that missed the registry cannot match in the token scan either
+        if not variable_registry or text_fragment.isidentifier(): return
+
+        potential_vars = _VAR_TOKEN_RE.findall(text_fragment)
+        ignore_keywords = _IGNORE_KEYWORDS
 
         for token in potential_vars:
-            cleaned_token = token
-            parts = token.split('.')
-            if len(parts) > 1 and parts[-1] in ignore_keywords:
-                cleaned_token = ".".join(parts[:-1])
-            
-            root = cleaned_token.split('.')[0]
-            
-            if root in variable_registry and root not in ignore_keywords:
-                src_id = variable_registry[root]
-                label = None
-                if "." in cleaned_token:
-                    suffix = cleaned_token.split('.', 1)[1]
-                    if suffix not in ignore_keywords:
-                        label = f".{suffix}"
-
-                edge_key = f"{src_id}|{target_node_id}|{label}"
-                if edge_key not in seen_edges:
-                    display_label = safe_get_label(label, "") if label else ""
-                    arrow = f'-- "{display_label}" -->' if label else f'{style}'
-                    lines.append(f'    {src_id} {arrow} {target_node_id}')
-                    seen_edges.add(edge_key)
+            # Drop a trailing method name (e.g. `ch.collect` -> `ch`)
+            head, dot, last = token.rpartition('.')
+            cleaned_token = head if dot and last in ignore_keywords else token
+
+            root, dot, suffix = cleaned_token.partition('.')
+            src_id = variable_registry.get(root)
+            if src_id is None or root in ignore_keywords: continue
+
+            label = f".{suffix}" if dot and suffix not in ignore_keywords else None
+            add_edge(src_id, target_node_id, label, lines, seen_edges, style)
 
     # --- 2. CONFIGURATION ---
-    lines = ["flowchart TD"]
-    lines.append("    classDef process fill:#e1f5fe,stroke:#01579b,stroke-width:2px;")
-    lines.append("    classDef subworkflow fill:#e8eaf6,stroke:#3f51b5,stroke-width:2px,stroke-dasharray: 5 5;")
-    lines.append("    classDef operator fill:#fff9c4,stroke:#fbc02d,stroke-width:2px,stroke-dasharray: 5 5;")
-    lines.append("    classDef data fill:#e0e0e0,stroke:#333,stroke-width:2px;")
-    lines.append("    classDef global fill:#f3e5f5,stroke:#7b1fa2,stroke-width:1px;")
+    lines = list(_MERMAID_HEADER)
 
     variable_registry = {} 
     seen_edges = set()
+    seen_nodes = set()
+    scope_ids = itertools.count()
 
     mw = get_val(ast, 'main_workflow')
     if not mw: return "flowchart TD\n    Empty[Empty Pipeline]"
@@ -141,112 +194,119 @@ def render_mermaid(ast: Union[Any, Dict[str, Any]]) -> str:
         lines.append(f'    {node_id}(["{safe_get_label(channel)}"]):::data')
         variable_registry[channel] = node_id
 
-    # --- 5. RECURSIVE BUILDER ---
+    # --- 5. STATEMENT BUILDER ---
     def process_statements(statements, subgraph_prefix=None):
-        for stmt in statements:
-            stype = get_val(stmt, 'type')
-
-            # CASE A: PROCESS CALL
-            if stype == 'process_call':
-                proc_name = get_val(stmt, 'process_name')
-                assign_to = get_val(stmt, 'assign_to')
-                proc_node_id = make_id(f"{subgraph_prefix}_proc_{proc_name}" if subgraph_prefix else f"proc_{proc_name}")
+        # Explicit stack of (iterator, prefix, subgraph to close, scope) instead of recursing into conditionals
+        stack = [(iter(statements), subgraph_prefix, None, next(scope_ids))]
+        while stack:
+            it, subgraph_prefix, close_id, scope = stack[-1]
+            for stmt in it:
+                stype = get_val(stmt, 'type')
+
+                # CASE A: PROCESS CALL
+                if stype == 'process_call':
+                    proc_name = get_val(stmt, 'process_name')
+                    assign_to = get_val(stmt, 'assign_to')
+                    proc_node_id = make_id(f"{subgraph_prefix}_proc_{proc_name}" if subgraph_prefix else f"proc_{proc_name}")
                 
-                label = safe_get_label(proc_name, "Process")
-                if proc_name in sub_workflow_names:
-                    lines.append(f'    {proc_node_id}[["{label}"]]:::subworkflow')
-                else:
-                    lines.append(f'    {proc_node_id}["{label}"]:::process')
+                    label = safe_get_label(proc_name, "Process")
+                    if proc_name in sub_workflow_names:
+                        add_node(scope, f'    {proc_node_id}[["{label}"]]:::subworkflow')
+                    else:
+                        add_node(scope, f'    {proc_node_id}["{label}"]:::process')
                 
-                args = get_val(stmt, 'args', [])
-                for arg in args:
-                    atype = get_val(arg, 'type')
-                    if atype == 'variable':
-                        resolve_variable_link(get_val(arg, 'name'), proc_node_id, variable_registry, lines, seen_edges)
-                    elif atype in ['string', 'numeric']:
-                        val = str(get_val(arg, 'value'))
-                        const_id = make_id(f"const_{val}_{proc_node_id}")
-                        if const_id not in seen_edges:
-                            lines.append(f'    {const_id}("{safe_get_label(val)}"):::global')
-                            lines.append(f'    {const_id} -.-> {proc_node_id}')
-                            seen_edges.add(const_id)
-                    elif isinstance(arg, str): 
-                        resolve_variable_link(arg, proc_node_id, variable_registry, lines, seen_edges)
-
-                if assign_to:
-                    var_node_id = f"Var_{make_id(assign_to)}_{proc_node_id}"
-                    lines.append(f'    {var_node_id}(("{safe_get_label(assign_to)}")):::data')
-                    lines.append(f'    {proc_node_id} --> {var_node_id}')
-                    variable_registry[assign_to] = var_node_id
+                    args = get_val(stmt, 'args', [])
+                    for arg in args:
+                        atype = get_val(arg, 'type')
+                        if atype == 'variable':
+                            resolve_variable_link(get_val(arg, 'name'), proc_node_id, variable_registry, lines, seen_edges)
+                        elif atype in ['string', 'numeric']:
+                            val = str(get_val(arg, 'value'))
+                            const_id = make_id(f"const_{val}_{proc_node_id}")
+                            add_node(scope,
+                                     f'    {const_id}("{safe_get_label(val)}"):::global',
+                                     f'    {const_id} -.-> {proc_node_id}')
+                        elif isinstance(arg, str): 
+                            resolve_variable_link(arg, proc_node_id, variable_registry, lines, seen_edges)
+
+                    if assign_to:
+                        var_node_id = f"Var_{make_id(assign_to)}_{proc_node_id}"
+                        add_node(scope,
+                                 f'    {var_node_id}(("{safe_get_label(assign_to)}")):::data',
+                                 f'    {proc_node_id} --> {var_node_id}')
+                        variable_registry[assign_to] = var_node_id
                 
-                variable_registry[proc_name] = proc_node_id
+                    variable_registry[proc_name] = proc_node_id
 
-            # CASE B: CHANNEL CHAIN
-            elif stype == 'channel_chain':
-                start_var = get_val(stmt, 'start_variable')
-                set_var = get_val(stmt, 'set_variable')
-                steps = get_val(stmt, 'steps', [])
+                # CASE B: CHANNEL CHAIN
+                elif stype == 'channel_chain':
+                    start_var = get_val(stmt, 'start_variable')
+                    set_var = get_val(stmt, 'set_variable')
+                    steps = get_val(stmt, 'steps', [])
                 
-                ops = [get_val(s, 'operator') for s in steps]
-                op_name = "\\n".join(ops)
-                op_node_id = make_id(f"op_{start_var}_{len(seen_edges)}")
+                    op_name = "\\n".join(get_val(s, 'operator') or '' for s in steps)
+                    op_node_id = make_id(f"op_{start_var}_{len(seen_nodes)}")
                 
-                lines.append(f'    {op_node_id}{{{{"{safe_get_label(op_name, "op")}"}}}}:::operator')
-
-                if start_var:
-                    resolve_variable_link(start_var, op_node_id, variable_registry, lines, seen_edges)
-
-                for step in steps:
-                    args = get_val(step, 'args', [])
-                    for arg in args:
-                         if isinstance(arg, str):
-                            resolve_variable_link(arg, op_node_id, variable_registry, lines, seen_edges, style="-.->")
-                    closure_lines = get_val(step, 'closure_lines', [])
-                    if closure_lines:
-                        resolve_variable_link(" ".join(closure_lines), op_node_id, variable_registry, lines, seen_edges, style="-.->")
-
-                if set_var:
-                    var_node_id = f"Var_{make_id(set_var)}_{op_node_id}"
-                    lines.append(f'    {var_node_id}(("{safe_get_label(set_var)}")):::data')
-                    lines.append(f'    {op_node_id} --> {var_node_id}')
-                    variable_registry[set_var] = var_node_id
-
-            # CASE C: CONDITIONAL
-            elif stype == 'conditional':
-                cond_str = safe_get_label(get_val(stmt, 'condition'), "condition")
-                sub_id = f"sub_{hashlib.md5(cond_str.encode()).hexdigest()[:4]}"
-                lines.append(f'    subgraph {sub_id} ["if {cond_str}"]')
-                lines.append(f'    direction TB')
-                process_statements(get_val(stmt, 'body', []), subgraph_prefix=sub_id)
-                lines.append("    end")
-                lines.append(f'    style {sub_id} fill:#ffebee,stroke:#c62828,stroke-dasharray: 5 5')
-
-            # CASE D: ASSIGNMENT
-            elif stype == 'assignment':
-                var_name = get_val(stmt, 'variable')
-                value = str(get_val(stmt, 'value'))
-                assign_id = make_id(f"assign_{var_name}")
+                    add_node(scope, f'    {op_node_id}{{{{"{safe_get_label(op_name, "op")}"}}}}:::operator')
+
+                    if start_var:
+                        resolve_variable_link(start_var, op_node_id, variable_registry, lines, seen_edges)
+
+                    for step in steps:
+                        args = get_val(step, 'args', [])
+                        for arg in args:
+                             if isinstance(arg, str):
+                                resolve_variable_link(arg, op_node_id, variable_registry, lines, seen_edges, style="-.->")
+                        closure_lines = get_val(step, 'closure_lines', [])
+                        if closure_lines:
+                            resolve_variable_link(" ".join(closure_lines), op_node_id, variable_registry, lines, seen_edges, style="-.->")
+
+                    if set_var:
+                        var_node_id = f"Var_{make_id(set_var)}_{op_node_id}"
+                        add_node(scope,
+                                 f'    {var_node_id}(("{safe_get_label(set_var)}")):::data',
+                                 f'    {op_node_id} --> {var_node_id}')
+                        variable_registry[set_var] = var_node_id
+
+                # CASE C: CONDITIONAL
+                elif stype == 'conditional':
+                    cond_str = safe_get_label(get_val(stmt, 'condition'), "condition")
+                    sub_id = f"sub_{hashlib.blake2b(cond_str.encode(), digest_size=2).hexdigest()}"
+                    lines.extend((f'    subgraph {sub_id} ["if {cond_str}"]', '    direction TB'))
+                    # Descend; the rest of this block resumes once the body is done
+                    stack.append((iter(get_val(stmt, 'body', [])), sub_id, sub_id, next(scope_ids)))
+                    break
+
+                # CASE D: ASSIGNMENT
+                elif stype == 'assignment':
+                    var_name = get_val(stmt, 'variable')
+                    value = str(get_val(stmt, 'value'))
+                    assign_id = make_id(f"assign_{var_name}")
                 
-                safe_val = safe_get_label(value)
-                if "(" in value and ")" in value:
-                    lines.append(f'    {assign_id}[["{safe_val}"]]:::process')
-                else:
-                    lines.append(f'    {assign_id}["{safe_val}"]:::operator')
+                    safe_val = safe_get_label(value)
+                    if "(" in value and ")" in value:
+                        add_node(scope, f'    {assign_id}[["{safe_val}"]]:::process')
+                    else:
+                        add_node(scope, f'    {assign_id}["{safe_val}"]:::operator')
                 
-                if var_name:
-                    var_node_id = f"Var_{make_id(var_name)}"
-                    lines.append(f'    {var_node_id}(("{safe_get_label(var_name)}")):::data')
-                    lines.append(f'    {assign_id} --> {var_node_id}')
-                    variable_registry[var_name] = var_node_id
+                    if var_name:
+                        var_node_id = f"Var_{make_id(var_name)}"
+                        add_node(scope,
+                                 f'    {var_node_id}(("{safe_get_label(var_name)}")):::data',
+                                 f'    {assign_id} --> {var_node_id}')
+                        variable_registry[var_name] = var_node_id
                 
-                resolve_variable_link(value, assign_id, variable_registry, lines, seen_edges)
+                    resolve_variable_link(value, assign_id, variable_registry, lines, seen_edges)
+            else:
+                stack.pop()
+                if close_id is not None:
+                    lines.extend(("    end", f'    style {close_id} fill:#ffebee,stroke:#c62828,stroke-dasharray: 5 5'))
 
     # --- 6. RENDER SUB-WORKFLOWS
     for sub in sub_workflows:
         sub_name = get_val(sub, 'name')
         # FIX: Use safe_get_label
-        lines.append(f'    subgraph {make_id(sub_name)}_scope ["Workflow: {safe_get_label(sub_name)}"]')
-        lines.append('    direction TB')
+        lines.extend((f'    subgraph {make_id(sub_name)}_scope ["Workflow: {safe_get_label(sub_name)}"]', '    direction TB'))
         
         sub_inputs = get_val(sub, 'take_channels', [])
         for inp in sub_inputs:
@@ -259,8 +319,7 @@ def render_mermaid(ast: Union[Any, Dict[str, Any]]) -> str:
         lines.append('    end')
 
     # --- 7. RENDER MAIN WORKFLOW ---
-    lines.append('    subgraph main_scope ["Main Workflow"]')
-    lines.append('    direction TB')
+    lines.extend(('    subgraph main_scope ["Main Workflow"]', '    direction TB'))
     process_statements(get_val(mw, 'body', []))
     lines.append('    end')
     
@@ -278,10 +337,10 @@ def render_mermaid(ast: Union[Any, Dict[str, Any]]) -> str:
 def renderer_node(state: GraphState):
     print("--- [NODE] RENDERER ---")
 
-    if state.get("error"): return {}
+    if state.error: return {}
 
     # 1. Normalize Input
-    raw_ast = state['ast_json']
+    raw_ast = state.ast_json
     ast_dict = raw_ast.model_dump() if hasattr(raw_ast, 'model_dump') else raw_ast
 
     try:
@@ -1,32 +1,32 @@
 from langchain_core.messages import HumanMessage
 from langgraph.graph import END
 from app.services.graph_state import GraphState
-from app.services.agents import ARCHITECT_SYSTEM_PROMPT
 
 def repair_node(state: GraphState):
     print("--- [NODE] REPAIR ---")
-    error_msg = state.get("validation_error", "Unknown validation error.")
+    error_msg = state.validation_error or "Unknown validation error."
 
     repair_instruction = f"""
     **VALIDATION FAILED**
     **THE ERROR:** {error_msg}
     
     ⚠️ **CRITICAL: YOU ARE DRIFTING FROM THE SCHEMA**
-    **HERE IS THE STRICT RULEBOOK. READ IT AGAIN:**
-    {ARCHITECT_SYSTEM_PROMPT}
+    **RE-READ THE STRICT RULEBOOK IN THE SYSTEM MESSAGE ABOVE.**
     
     **INSTRUCTION:**
     1. Read the error message above.
     2. Generate the **FULLY CORRECTED** JSON AST.
     """
     
-    new_messages = state["messages"] + [HumanMessage(content=repair_instruction)]
+    # Append-only: the system rulebook and original request stay as an unchanged
+    # prefix so Mistral can reuse its prompt cache on every retry.
+    new_messages = state.messages + [HumanMessage(content=repair_instruction)]
     return {"messages": new_messages}
 
 def should_repair(state: GraphState):
     MAX_RETRIES = 3
-    error = state.get("validation_error")
-    retries = state.get("retries", 0)
+    error = state.validation_error
+    retries = state.retries
 
     if not error: return "success"
     if retries >= MAX_RETRIES: return "fail"
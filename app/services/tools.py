@@ -1,17 +1,15 @@
-import json
+import asyncio
+from app.core.batching import BatcherStopped
 from app.core.loader import data_loader
 from app.services.graph_state import GraphState
 
 def _inject_component(comp_id, found_ids, context_blocks, embed_code=True):
-    COMP_DB = data_loader.comp_db
-    CODE_DB = data_loader.code_db
-    
     if comp_id in found_ids: return
-    if comp_id not in COMP_DB: return
+    # One lookup instead of `in` + `[]`: with the LMDB store each is a read + JSON decode
+    comp_data = data_loader.comp_db.get(comp_id)
+    if comp_data is None: return
 
     found_ids.add(comp_id)
-    comp_data = COMP_DB[comp_id]
-    code_snippet = CODE_DB.get(comp_id, "// Code not found in repository")
 
     block = f"""
 --- COMPONENT: {comp_id} ---
@@ -23,23 +21,21 @@ OUTPUTS: {', '.join(comp_data.get('output_types', []))}
 """
 
     if embed_code:
+        code_snippet = data_loader.code_db.get(comp_id, "// Code not found in repository")
         block += f"\n**SOURCE CODE ({comp_id}.nf):**\n```groovy\n{code_snippet}\n```\n"
 
     context_blocks.append(block)
 
 def _inject_template(template_id, found_ids, context_blocks, embed_code=True):
-    TMPL_DB = data_loader.tmpl_db
-    CODE_DB = data_loader.code_db
-
     if template_id in found_ids: return
-    if template_id not in TMPL_DB: return
+    if template_id not in data_loader.tmpl_db: return
 
     found_ids.add(template_id)
 
     block = ""
 
     if embed_code:
-        code_snippet = CODE_DB.get(template_id, "// Code not found in repository")
+        code_snippet = data_loader.code_db.get(template_id, "// Code not found in repository")
         block += f"\n**SOURCE CODE ({template_id}.nf):**\n```groovy\n{code_snippet}\n```\n"
 
     context_blocks.append(block)
@@ -49,8 +45,58 @@ def retrieve_rag_context(user_query, embed_code=False):
     if not data_loader.vector_store:
         return "Vector Store not loaded."
     
-    docs = data_loader.vector_store.similarity_search(user_query, k=5)
+    docs = None
+    embed_batcher = data_loader.embed_batcher
+    if embed_batcher:
+        try:
+            query_vector = embed_batcher.embed_query(user_query)
+            docs = data_loader.vector_store.similarity_search_by_vector(query_vector, k=5)
+        except BatcherStopped:
+            pass  # Shutting down: embed inline below
+    if docs is None:
+        docs = data_loader.vector_store.similarity_search(user_query, k=5)
+
+    return _assemble_context(docs, embed_code)
+
+async def aretrieve_rag_context(user_query, embed_code=False):
+    """Async retrieve_rag_context: awaits the embed batcher, searches off the event loop."""
+    vector_store = data_loader.vector_store
+    if not vector_store:
+        return "Vector Store not loaded."
 
+    docs = None
+    embed_batcher = data_loader.embed_batcher
+    if embed_batcher:
+        try:
+            query_vector = await embed_batcher.process_batched(user_query)
+            docs = await asyncio.to_thread(vector_store.similarity_search_by_vector, query_vector, k=5)
+        except BatcherStopped:
+            pass  # Shutting down: embed inline below
+    if docs is None:
+        docs = await asyncio.to_thread(vector_store.similarity_search, user_query, k=5)
+
+    return _assemble_context(docs, embed_code)
+
+# Logic-flow keys whose items may hold nested steps (Parallel/Branching/Next)
+_SUB_KEYS = ('parallel_execution', 'branches', 'options')
+
+def _template_step_ids(tmpl):
+    """Yields every component id in a template's logic_flow, in flow order."""
+    for flow_step in tmpl.get('logic_flow', ()):
+        # Direct Steps
+        if 'step' in flow_step:
+            yield flow_step['step']
+
+        # Complex Logic, including 'next' chaining
+        for sub_key in _SUB_KEYS:
+            for item in flow_step.get(sub_key, ()):
+                if 'step' in item:
+                    yield item['step']
+                for sub_item in item.get('next', ()):
+                    if 'step' in sub_item:
+                        yield sub_item['step']
+
+def _assemble_context(docs, embed_code):
     TMPL_DB = data_loader.tmpl_db
 
     found_ids = set()
@@ -66,35 +112,19 @@ def retrieve_rag_context(user_query, embed_code=False):
             continue
 
         # --- PATH 1: TEMPLATE (Pipeline Blueprint) ---
-        if item_type == 'template' and item_id in TMPL_DB:
-            tmpl = TMPL_DB[item_id]
-            # Mark template as found
+        if item_type == 'template':
+            tmpl = TMPL_DB.get(item_id)
+            if tmpl is None: continue
         
             context_blocks.append(f"### PIPELINE BLUEPRINT: {item_id}\n{doc.page_content}")
-            # print("This should injec tthe template details into the context")
             _inject_template(tmpl['id'], found_ids, context_blocks, embed_code=True)
 
+            # Mark template as found
             found_ids.add(item_id)
 
-            # Recursive Expansion: Fetch all children components
-            for flow_step in tmpl.get('logic_flow', []):
-
-                # Direct Steps
-                if 'step' in flow_step:
-                    _inject_component(flow_step['step'], found_ids, context_blocks, embed_code)
-
-                # Complex Logic (Parallel/Branching/Next)
-                for sub_key in ['parallel_execution', 'branches', 'options']:
-                    if sub_key in flow_step:
-                        for item in flow_step[sub_key]:
-                            if 'step' in item:
-                                _inject_component(item['step'], found_ids, context_blocks, embed_code)
-
-                            # Handle 'next' chaining
-                            if 'next' in item:
-                                for sub_item in item['next']:
-                                    if 'step' in sub_item:
-                                        _inject_component(sub_item['step'], found_ids, context_blocks, embed_code)
+            # Expansion: Fetch all children components
+            for comp_id in _template_step_ids(tmpl):
+                _inject_component(comp_id, found_ids, context_blocks, embed_code)
 
         # --- PATH 2: COMPONENT (Direct Hit) ---
         elif item_type == 'component':
@@ -105,11 +135,18 @@ def retrieve_rag_context(user_query, embed_code=False):
 
     return final_context
 
+def _detect_helpers(code, detected):
+    automaton = data_loader.helper_automaton
+    if automaton is not None:
+        detected.update(name for _, name in automaton.iter(code))
+    else:
+        detected.update(h for h in data_loader.helper_names if h in code)
+
 def hydrator_node(state: GraphState):
     print("--- [NODE] HYDRATOR (Context Assembly) ---")
     
     # Extract the plan 
-    plan = state['design_plan']
+    plan = state.design_plan
 
     context_parts = []
     detected_helpers = set()
@@ -123,8 +160,7 @@ def hydrator_node(state: GraphState):
     # Access Global Data
     TMPL_DB = data_loader.tmpl_db
     CODE_DB = data_loader.code_db
-    RES_LIST = data_loader.res_list
-    HELPER_NAMES = {r['name'] for r in RES_LIST}
+    RES_BY_NAME = data_loader.res_by_name
 
     # ==========================================
     # PATH A: STRICT TEMPLATE MODE
@@ -145,8 +181,7 @@ def hydrator_node(state: GraphState):
                 context_parts.append(f"```groovy\n{tmpl_code.strip()}\n```")
                 context_parts.append(f"[[END TEMPLATE SOURCE]]")
                 
-                for h in HELPER_NAMES:
-                    if h in tmpl_code: detected_helpers.add(h)
+                _detect_helpers(tmpl_code, detected_helpers)
             
             # 2. Get Dependencies (Reference Tools inside the template)
             for step in template_def.get('logic_flow', []):
@@ -158,8 +193,7 @@ def hydrator_node(state: GraphState):
                         context_parts.append(f"```groovy\n{code.strip()}\n```")
                         context_parts.append(f"[[END REFERENCE]]")
                         
-                        for h in HELPER_NAMES:
-                            if h in code: detected_helpers.add(h)
+                        _detect_helpers(code, detected_helpers)
 
     # ==========================================
     # PATH B: CUSTOM ASSEMBLY MODE
@@ -174,8 +208,7 @@ def hydrator_node(state: GraphState):
 
                 context_parts.append(f"[[TEMPLATE SOURCE CODE: {used_template_id}]]")
                 context_parts.append(f"```groovy\n{tmpl_code.strip()}\n```")
-                for h in HELPER_NAMES:
-                    if h in tmpl_code: detected_helpers.add(h)
+                _detect_helpers(tmpl_code, detected_helpers)
         else:
             context_parts.append("### CUSTOM BUILD MODE")
 
@@ -192,8 +225,7 @@ def hydrator_node(state: GraphState):
                     context_parts.append(f"Component ID: {comp_id}")
                     context_parts.append(f"```groovy\n{source_code.strip()}\n```")
                     context_parts.append(f"[[END REFERENCE: {step_alias}]]")
-                    for h in HELPER_NAMES:
-                        if h in source_code: detected_helpers.add(h)
+                    _detect_helpers(source_code, detected_helpers)
             
             elif source_type == "CUSTOM_SCRIPT":
 
@@ -209,14 +241,17 @@ def hydrator_node(state: GraphState):
     # ==========================================
     # RESOURCE INJECTION
     # ==========================================
-    plan_str = json.dumps(plan)
-    if "cross" in plan_str or "multiMap" in plan_str:
-        detected_helpers.add("extractKey")
+    # Operators only appear in the logic snippets; descriptions are prose
+    for step in workflow_logic:
+        snippet = step.get('code_snippet') or ""
+        if "cross" in snippet or "multiMap" in snippet:
+            detected_helpers.add("extractKey")
+            break
     
     if detected_helpers:
         context_parts.append("\n### AVAILABLE HELPER FUNCTIONS")
         for h_name in detected_helpers:
-            res_def = next((r for r in RES_LIST if r['name'] == h_name), None)
+            res_def = RES_BY_NAME.get(h_name)
             if res_def:
                 context_parts.append(f"- {h_name}: {res_def.get('description')}")
                 context_parts.append(f"  Usage: `{res_def.get('usage')}`")
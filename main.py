@@ -10,4 +10,4 @@ if __name__ == "__main__":
     #   app/      (folder)
     #   api.py    (file)
     #   app       (variable inside api.py)
-    uvicorn.run("app.api:app", host="0.0.0.0", port=port, reload=False)
\ No newline at end of file
+    uvicorn.run("app.api:app", host="0.0.0.0", port=port, reload=False, loop="uvloop", http="httptools")
\ No newline at end of file